@@ -0,0 +1,63 @@
+import os
+import copy
+import glob
+import json
+import time
+import argparse
+
+import pdfparser
+from pdfparser import PageTextStore, build_tree_and_fill
+from heading_reference import load_book, reference_heading_appears_on_page
+
+
+# Совпадение результатов проверяет test_headings.py; здесь — только время разбора
+NEW_MATCHER = pdfparser.heading_appears_on_page
+
+
+def build_with(matcher, texts, entries):
+    pdfparser.heading_appears_on_page = matcher
+    try:
+        store = PageTextStore(None, texts=texts)
+        t0 = time.perf_counter()
+        build_tree_and_fill(copy.deepcopy(entries), len(texts), store)
+        return time.perf_counter() - t0
+    finally:
+        pdfparser.heading_appears_on_page = NEW_MATCHER
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Время поиска заголовков на книгах DB/DataSet: прежний перебор окон и новый поиск")
+    parser.add_argument("--dataset", default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "DataSet"))
+    parser.add_argument("--books", type=int, default=0, help="ограничить число книг (0 — все)")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.dataset, "*.json")))
+    if args.books:
+        paths = paths[:args.books]
+
+    total_old = total_new = 0.0
+    print("Книга | страниц | было, с | стало, с")
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        try:
+            texts, entries = load_book(path)
+        except (json.JSONDecodeError, KeyError) as e:
+            print(f"{name} | пропущена: {e}")
+            continue
+        if not texts or len(entries) < 2:
+            continue
+
+        old_time = build_with(reference_heading_appears_on_page, texts, entries)
+        new_time = build_with(NEW_MATCHER, texts, entries)
+        total_old += old_time
+        total_new += new_time
+        print(f"{name[:60]} | {len(texts)} | {old_time:.2f} | {new_time:.2f}")
+
+    print(f"Итого: было {total_old:.1f} с, стало {total_new:.1f} с "
+          f"(x{total_old / max(total_new, 1e-9):.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import re
+import json
+
+from pdfparser import aggressive_normalize, jaccard_similarity, normalized_heading
+
+
+PAGE_MARKER = re.compile(r'--- Страница (\d+) ---(?: \(продолжение\))?\n?')
+
+
+# Прежняя реализация fuzzy-поиска — эталон для сравнения
+def reference_window_match(norm_p, norm_h, threshold):
+    L = len(norm_h)
+    best_sim = 0.0
+    for i in range(max(0, len(norm_p) - L + 1)):
+        window = norm_p[i:i + L]
+        sim = jaccard_similarity(norm_h, window, n=2)
+        if sim > best_sim:
+            best_sim = sim
+            if best_sim >= threshold:
+                return True
+    return best_sim >= threshold
+
+
+def reference_heading_appears_on_page(page_text, heading, exact_prefix_len=20,
+                                      fuzzy_threshold=0.95, norm_page=None):
+    if not heading or not page_text:
+        return False
+    norm_h = normalized_heading(heading)
+    norm_p = aggressive_normalize(page_text) if norm_page is None else norm_page
+    if not norm_h:
+        return False
+    if norm_h in norm_p:
+        return True
+    if norm_h[:min(exact_prefix_len, len(norm_h))] in norm_p:
+        return True
+    return reference_window_match(norm_p, norm_h, fuzzy_threshold)
+
+
+def load_book(path):
+    """Страницы и оглавление книги, восстановленные из JSON датасета"""
+    with open(path, 'r', encoding='utf-8') as f:
+        book = json.load(f)
+
+    pages = {}
+    entries = []
+
+    def walk(nodes, level):
+        for node in nodes:
+            entry = {"title": node["name"], "level": level, "page_start": None}
+            entries.append(entry)
+            starts = []
+            if node.get("chapters"):
+                starts.extend(walk(node["chapters"], level + 1))
+            content = node.get("content") or ""
+            parts = PAGE_MARKER.split(content)
+            # parts: [до первого маркера, номер, текст, номер, текст, ...]
+            for num, text in zip(parts[1::2], parts[2::2]):
+                pages.setdefault(int(num), []).append(text.strip())
+                starts.append(int(num))
+            if node.get("debug", {}).get("start_page"):
+                starts.append(node["debug"]["start_page"])
+            entry["page_start"] = min(starts) if starts else None
+            yield from starts
+
+    list(walk(book.get("chapters") or [], 1))
+    if not pages:
+        return None, None
+    entries = [e for e in entries if e["page_start"]]
+    texts = [" ".join(pages.get(p, [])) for p in range(1, max(pages) + 1)]
+    return texts, entries
+
+
+def mutate(text, rnd):
+    """Заголовок «с опечаткой»: замена, удаление или вставка символа"""
+    i = rnd.randrange(len(text))
+    op = rnd.choice(("replace", "delete", "insert"))
+    ch = rnd.choice("абвгдеклмнопрстxyz0123456789")
+    if op == "replace":
+        return text[:i] + ch + text[i + 1:]
+    if op == "delete":
+        return text[:i] + text[i + 1:]
+    return text[:i] + ch + text[i:]
@@ -2,9 +2,20 @@
 import os
 import re
 import json
+import time
+import hashlib
+import argparse
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from PyPDF2 import PdfReader
 
 
+DEFAULT_FOLDER = r"D:\Work\MIFI\Hakhathon\Books\ML_Python"
+# Книги больше этого числа страниц извлекаются в пуле по диапазонам страниц
+PARALLEL_PAGES_MIN = 120
+PAGES_PER_TASK = 40
+
+
 def get_chapter_name(heading_pattern, clean, simple_page):
     match = heading_pattern.match(clean)
     if match:
@@ -124,7 +135,7 @@ def parse_toc_lines(lines):
 
 
 # Определяем лист СОДЕРЖАНИЕ
-def extract_toc_text(pdf_reader, max_toc_pages=25):
+def extract_toc_text(store, max_toc_pages=25):
     """
     Извлекает текст оглавления, читая подряд страницы от первого вхождения
     'Содержание' до тех пор, пока не будет найдена первая глава (по номеру страницы)
@@ -133,12 +144,12 @@ def extract_toc_text(pdf_reader, max_toc_pages=25):
     Возвращает: текст оглавления (все страницы подряд), или None.
     """
     KEYWORDS = ["Содержание", "Оглавление", "Contents", "Table of Contents"]
-    total_pages = len(pdf_reader.pages)
+    total_pages = len(store)
     
     # 1. Ищем первую страницу с оглавлением
     toc_start_idx = None
     for i in range(total_pages):
-        text = pdf_reader.pages[i].extract_text()
+        text = store.raw(i)
         if text and any(kw.lower() in text.lower() for kw in KEYWORDS):
             toc_start_idx = i
             break
@@ -155,7 +166,7 @@ def extract_toc_text(pdf_reader, max_toc_pages=25):
 
     # Будем читать от toc_start_idx вперёд
     for idx in range(toc_start_idx, min(toc_start_idx + max_toc_pages, total_pages)):
-        page_text = pdf_reader.pages[idx].extract_text()
+        page_text = store.raw(idx)
         if not page_text:
             # Пустая страница — скорее всего, скан → остановимся
             break
@@ -190,12 +201,12 @@ def extract_toc_text(pdf_reader, max_toc_pages=25):
 # TEXT EXTRACTION (skip image pages)
 # Извлекает текст из диапазона страниц, пропуская пустые (сканы).
 # Страницы в книгах могут быть отсканированы и текста не иметь
-def extract_page_range(reader, start_1b, end_1b):
+def extract_page_range(store, start_1b, end_1b):
 
     text_lines = []
-    n = len(reader.pages)
+    n = len(store)
     for p in range(start_1b - 1, min(end_1b, n)):
-        raw = reader.pages[p].extract_text()
+        raw = store.raw(p)
         if raw and raw.strip():
             clean = re.sub(r'\n\s*\n', '\n\n', raw)
             text_lines.append(f"--- Страница {p + 1} ---")
@@ -227,6 +238,61 @@ def jaccard_similarity(a, b, n=2):
     union = set_a | set_b
     return len(intersection) / len(union) if union else 0.0
 
+def best_window_match(norm_p, norm_h, threshold):
+    """
+    Есть ли в norm_p окно длины len(norm_h) с jaccard_similarity(norm_h, окно) >= threshold.
+
+    Результат тот же, что у перебора окон с jaccard_similarity, но за O(len(norm_p)):
+    окно сдвигается на символ, мультимножество его биграмм обновляется
+    инкрементально (одна биграмма уходит, одна приходит), а пересечение и
+    объединение с биграммами заголовка пересчитываются за O(1).
+    """
+    L = len(norm_h)
+    if len(norm_p) < L:
+        return 0.0 >= threshold
+    if L < 2:
+        # Окна из одного символа: сходство 1 только при точном совпадении
+        return (1.0 if norm_h in norm_p else 0.0) >= threshold
+
+    h_grams = get_ngrams(norm_h, 2)
+    n_h = len(h_grams)
+
+    # Верхняя оценка для любого окна: пересечение не больше |H ∩ P|, объединение не меньше |H|
+    page_grams = get_ngrams(norm_p, 2)
+    if len(h_grams & page_grams) / n_h < threshold:
+        return False
+
+    counts = {}
+    inter = 0
+    for j in range(L - 1):
+        g = norm_p[j:j + 2]
+        c = counts.get(g, 0)
+        counts[g] = c + 1
+        if c == 0 and g in h_grams:
+            inter += 1
+
+    i = 0
+    while True:
+        if inter / (n_h + len(counts) - inter) >= threshold:
+            return True
+        if i + L >= len(norm_p):
+            return False
+        # Сдвиг окна на один символ
+        out_g = norm_p[i:i + 2]
+        c = counts[out_g] - 1
+        if c:
+            counts[out_g] = c
+        else:
+            del counts[out_g]
+            if out_g in h_grams:
+                inter -= 1
+        in_g = norm_p[i + L - 1:i + L + 1]
+        c = counts.get(in_g, 0)
+        counts[in_g] = c + 1
+        if c == 0 and in_g in h_grams:
+            inter += 1
+        i += 1
+
 # Агрессивная нормализация: удаляем всё кроме букв/цифр, нижний регистр, ё→е.
 def aggressive_normalize(text):
     if not text:
@@ -258,10 +324,14 @@ def strip_trailing_page_number(text):
             return text[:match.start()].rstrip()
     return text
 
-def if_chapter_starts_with(page_text, heading):
-    clean_heading = strip_trailing_page_number(heading)
-    norm_h = aggressive_normalize(clean_heading)
-    norm_p = aggressive_normalize(page_text)
+@lru_cache(maxsize=4096)
+def normalized_heading(heading):
+    """Нормализованный заголовок без номера страницы (одни и те же заголовки ищутся на каждой странице)"""
+    return aggressive_normalize(strip_trailing_page_number(heading))
+
+def if_chapter_starts_with(page_text, heading, norm_page=None):
+    norm_h = normalized_heading(heading)
+    norm_p = aggressive_normalize(page_text) if norm_page is None else norm_page
     
     if norm_p.startswith(norm_h):
         return True
@@ -270,7 +340,8 @@ def if_chapter_starts_with(page_text, heading):
 
 def heading_appears_on_page(page_text, heading, 
                              exact_prefix_len=20, 
-                             fuzzy_threshold=0.95):
+                             fuzzy_threshold=0.95,
+                             norm_page=None):
     """
     Проверяет, встречается ли heading в page_text, устойчиво к:
     - разрывам слов (эволюци онные),
@@ -281,13 +352,14 @@ def heading_appears_on_page(page_text, heading,
     1. Точное вхождение нормализованной строки.
     2. Вхождение первых N символов (быстро и надёжно для уникальных заголовков).
     3. Fuzzy-сравнение по n-граммам (если 1–2 не сработали).
+
+    norm_page — уже нормализованный текст страницы (PageTextStore.norm).
     """
     if not heading or not page_text:
         return False
 
-    clean_heading = strip_trailing_page_number(heading)
-    norm_h = aggressive_normalize(clean_heading)
-    norm_p = aggressive_normalize(page_text)
+    norm_h = normalized_heading(heading)
+    norm_p = aggressive_normalize(page_text) if norm_page is None else norm_page
 
     if not norm_h:
         return False
@@ -302,30 +374,17 @@ def heading_appears_on_page(page_text, heading,
     if prefix in norm_p:
         return True
 
-    # 3. Fuzzy: ищем наилучшее совпадение окна ~len(norm_h)
-    L = len(norm_h)
-    if L == 0:
-        return False
-
-    best_sim = 0.0
-    for i in range(max(0, len(norm_p) - L + 1)):
-        window = norm_p[i:i + L]
-        sim = jaccard_similarity(norm_h, window, n=2)
-        if sim > best_sim:
-            best_sim = sim
-            if best_sim >= fuzzy_threshold:
-                return True
+    # 3. Fuzzy: ищем окно ~len(norm_h), похожее по биграммам
+    return best_window_match(norm_p, norm_h, fuzzy_threshold)
 
-    return best_sim >= fuzzy_threshold
-
-def extract_chapter_content(reader, start_page_1b, next_chapter_title=None, total_pages=None):
+def extract_chapter_content(store, start_page_1b, next_chapter_title=None, total_pages=None):
     """
     Извлекает текст главы, начиная со start_page_1b,
     и останавливается, когда находит next_chapter_title (если задан).
     Возвращает: (content_text, actual_end_page_1b)
     """
     if total_pages is None:
-        total_pages = len(reader.pages)
+        total_pages = len(store)
 
     content_lines = []
     actual_end = start_page_1b
@@ -333,14 +392,15 @@ def extract_chapter_content(reader, start_page_1b, next_chapter_title=None, tota
     # Читаем от start_page_1b до конца или до обнаружения следующей главы
     for p_idx_0b in range(start_page_1b - 1, total_pages):
         page_num = p_idx_0b + 1
-        raw = reader.pages[p_idx_0b].extract_text()
+        raw = store.raw(p_idx_0b)
         if not raw:
             # Страница-скан: пропускаем, но продолжаем (глава может идти дальше)
             actual_end = page_num
             continue
 
         # Проверка: если ищем следующую главу — есть ли она на этой странице?
-        if next_chapter_title and heading_appears_on_page(raw, next_chapter_title):
+        if next_chapter_title and heading_appears_on_page(raw, next_chapter_title,
+                                                          norm_page=store.norm(p_idx_0b)):
             # Нашли начало следующей главы → останавливаемся ДО этой страницы
             # Но: если мы только начали (page_num == start_page_1b), то глава — 0 страниц?
             # Решение: включаем эту страницу, НО обрезаем текст до заголовка
@@ -376,7 +436,7 @@ def update_start_page_if_needed(data: dict) -> dict:
             # Опционально: можно также обновить end_page по аналогии, если нужно
     return data
 
-def build_tree_and_fill(entries, total_pages, reader):
+def build_tree_and_fill(entries, total_pages, store):
     """
     Строит дерево глав, но ИЗВЛЕКАЕТ содержимое ТОЛЬКО по появлению заголовков
     в тексте — номера страниц из оглавления используются ТОЛЬКО для сортировки.
@@ -405,13 +465,10 @@ def build_tree_and_fill(entries, total_pages, reader):
     # Проходим по ВСЕМ страницам книги подряд
     for p_idx_0b in range(start_page, total_pages):
         page_num = p_idx_0b + 1
-        raw = reader.pages[p_idx_0b].extract_text()
-        
+        raw = store.flat(p_idx_0b)
         if not raw:
             continue
-
-        raw = re.sub(r'\.{2,}', ' ', raw)
-        raw = re.sub(r'\s+', ' ', raw).strip()
+        norm_page = store.norm(p_idx_0b)
         
         # Проверяем: не начинается ли НОВАЯ глава на этой странице?
         next_heading = None
@@ -423,15 +480,13 @@ def build_tree_and_fill(entries, total_pages, reader):
             current_heading = ordered_headings[current_idx]
             # Проверим: может, ЭТО — начало ТЕКУЩЕЙ главы? (для первой)
             if current_idx == 0 and not current_content_lines:
-                if heading_appears_on_page(raw, current_heading):
+                if heading_appears_on_page(raw, current_heading, norm_page=norm_page):
                     current_start_physical = page_num
                     
             # === Проверка: встречается ли ЗАГОЛОВОК СЛЕДУЮЩЕЙ главы на этой странице? ===
-            if next_heading and heading_appears_on_page(raw, next_heading):
+            if next_heading and heading_appears_on_page(raw, next_heading, norm_page=norm_page):
                 # Найдём позицию (приблизительно) — ищем normalized substring
                 clean_heading = strip_trailing_page_number(next_heading)
-                norm_h = aggressive_normalize(clean_heading)
-                norm_page = aggressive_normalize(raw)
     
                 # Ищем начало совпадения в НЕнормализованном тексте (лучше сохранить регистр)
                 # Используем "мягкое" сравнение: приведём к нижнему, удалим пунктуацию
@@ -465,7 +520,7 @@ def build_tree_and_fill(entries, total_pages, reader):
                     current_content_lines.append(clean_cur)
     
     
-                is_in = if_chapter_starts_with(raw, next_heading)
+                is_in = if_chapter_starts_with(raw, next_heading, norm_page=norm_page)
     
     
                 # Закрываем текущую главу
@@ -592,13 +647,127 @@ def build_tree_and_fill(entries, total_pages, reader):
     tree = fold_into_tree(chapters_flat, entries)
     return tree
 
+# PAGE TEXT STORE
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class PageTextStore:
+    """
+    Текст страниц одной книги: каждая страница извлекается из PDF один раз
+    (по первому запросу), сырой и нормализованные варианты кэшируются.
+
+    С cache_dir извлечённый текст сохраняется в <cache_dir>/<sha256 PDF>.json,
+    и повторные запуски (например, при подборе эвристик заголовков) не
+    извлекают страницы заново.
+    """
+
+    def __init__(self, pdf_path, texts=None, cache_dir=None):
+        self.pdf_path = pdf_path
+        self._reader = None
+        self._cache_path = None
+        self._dirty = False
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._cache_path = os.path.join(cache_dir, file_sha256(pdf_path) + '.json')
+            if texts is None:
+                texts = self.load_cached(self._cache_path)
+            else:
+                self._dirty = not os.path.exists(self._cache_path)
+
+        if texts is None:
+            texts = [None] * len(self.reader.pages)
+        self._raw = list(texts)
+        self._flat = {}
+        self._norm = {}
+
+    @staticmethod
+    def load_cached(cache_path):
+        if not cache_path or not os.path.exists(cache_path):
+            return None
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def has_cache(pdf_path, cache_dir):
+        """Есть ли текст страниц книги в кэше на диске (сам кэш не читается)"""
+        if not cache_dir:
+            return False
+        return os.path.exists(os.path.join(cache_dir, file_sha256(pdf_path) + '.json'))
+
+    @property
+    def reader(self):
+        if self._reader is None:
+            self._reader = PdfReader(self.pdf_path)
+        return self._reader
+
+    def __len__(self):
+        return len(self._raw)
+
+    def raw(self, idx_0b):
+        """Текст страницы как его вернул PyPDF2 ('' для страниц-сканов)"""
+        text = self._raw[idx_0b]
+        if text is None:
+            text = self.reader.pages[idx_0b].extract_text() or ''
+            self._raw[idx_0b] = text
+            self._dirty = True
+        return text
+
+    def flat(self, idx_0b):
+        """Текст страницы без многоточий, в одну строку"""
+        text = self._flat.get(idx_0b)
+        if text is None:
+            text = re.sub(r'\.{2,}', ' ', self.raw(idx_0b))
+            text = re.sub(r'\s+', ' ', text).strip()
+            self._flat[idx_0b] = text
+        return text
+
+    def norm(self, idx_0b):
+        """aggressive_normalize текста страницы — для поиска заголовков"""
+        text = self._norm.get(idx_0b)
+        if text is None:
+            text = aggressive_normalize(self.raw(idx_0b))
+            self._norm[idx_0b] = text
+        return text
+
+    def save(self):
+        if not self._cache_path or not self._dirty:
+            return
+        tmp = self._cache_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._raw, f, ensure_ascii=False)
+        os.replace(tmp, self._cache_path)
+        self._dirty = False
+
+
+# PARALLEL EXTRACTION
+
+def extract_pages_range(pdf_path, start_0b, end_0b):
+    """Текст страниц [start_0b, end_0b) — задача для процесса пула"""
+    t0 = time.perf_counter()
+    reader = PdfReader(pdf_path)
+    texts = [reader.pages[i].extract_text() or '' for i in range(start_0b, end_0b)]
+    return start_0b, texts, time.perf_counter() - t0
+
+
 # Извлекаем содержимое книги
-def process_book(pdf_path):
+def process_book(pdf_path, page_texts=None, cache_dir=None):
+    """
+    page_texts — заранее извлечённый текст всех страниц (параллельный режим);
+    без него страницы читаются из PDF по мере надобности.
+    cache_dir — папка дискового кэша текста страниц (PageTextStore).
+    """
     try:
-        reader = PdfReader(pdf_path)
-        total = len(reader.pages)
+        store = PageTextStore(pdf_path, texts=page_texts, cache_dir=cache_dir)
+        total = len(store)
 
-        toc_text = extract_toc_text(reader)
+        toc_text = extract_toc_text(store)
+        store.save()
         if not toc_text:
             print(f"Оглавление не найдено: {os.path.basename(pdf_path)}")
             return None
@@ -609,7 +778,8 @@ def process_book(pdf_path):
             print(f"Не распознано глав: {os.path.basename(pdf_path)}")
             return None
 
-        chapters_tree = build_tree_and_fill(entries, total, reader)
+        chapters_tree = build_tree_and_fill(entries, total, store)
+        store.save()
 
         title = os.path.splitext(os.path.basename(pdf_path))[0]
         return {
@@ -623,33 +793,158 @@ def process_book(pdf_path):
         traceback.print_exc()
         return None
 
+def parse_book_task(pdf_path, page_texts=None, cache_dir=None):
+    """Задача для процесса пула: разбор книги + время разбора"""
+    t0 = time.perf_counter()
+    result = process_book(pdf_path, page_texts, cache_dir)
+    return result, time.perf_counter() - t0
+
+
+def save_result(result, out_path):
+    """Атомарная запись JSON: прерванный запуск не оставляет обрезанных файлов"""
+    tmp = out_path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, out_path)
+
+
+def book_out_path(pdf_path, out_dir):
+    return os.path.join(out_dir, os.path.splitext(os.path.basename(pdf_path))[0] + ".json")
+
+
+def finish_book(pdf_path, result, out_dir):
+    if result:
+        save_result(result, book_out_path(pdf_path, out_dir))
+        n_top = len(result["chapters"]) if result["chapters"] else 0
+        print(f"{os.path.basename(pdf_path)} — {n_top} глав")
+
+
+def run_sequential(pdf_paths, out_dir, cache_dir=None):
+    stats = {}
+    for path in pdf_paths:
+        print(f"{os.path.basename(path)}...")
+        t0 = time.perf_counter()
+        result = process_book(path, cache_dir=cache_dir)
+        stats[path] = {"extract": 0.0, "parse": time.perf_counter() - t0, "result": result}
+        finish_book(path, result, out_dir)
+    return stats
+
+
+def run_parallel(pdf_paths, out_dir, workers, pages_per_task=PAGES_PER_TASK, cache_dir=None):
+    """
+    Один пул процессов на все книги. Маленькие книги разбираются целиком
+    в одном процессе; у больших сначала параллельно извлекается текст
+    по диапазонам страниц, затем разбор структуры идёт отдельной задачей.
+    Если диапазон не извлёкся, книга разбирается целиком одной задачей.
+    """
+    stats = {}
+    pending_pages = {}  # книга -> (тексты страниц, число оставшихся диапазонов)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for path in pdf_paths:
+            stats[path] = {"extract": 0.0, "parse": 0.0, "result": None}
+            try:
+                if PageTextStore.has_cache(path, cache_dir):
+                    # Текст уже в кэше — извлекать нечего
+                    futures[pool.submit(parse_book_task, path, None, cache_dir)] = ("parse", path)
+                    continue
+                total = len(PdfReader(path).pages)
+            except Exception as e:
+                print(f"❌ Ошибка открытия {path}: {e}")
+                continue
+
+            if total < PARALLEL_PAGES_MIN:
+                futures[pool.submit(parse_book_task, path, None, cache_dir)] = ("parse", path)
+                continue
+
+            ranges = [(s, min(s + pages_per_task, total)) for s in range(0, total, pages_per_task)]
+            pending_pages[path] = ([None] * total, len(ranges))
+            for start, end in ranges:
+                futures[pool.submit(extract_pages_range, path, start, end)] = ("extract", path)
+
+        while futures:
+            future = next(as_completed(futures))
+            kind, path = futures.pop(future)
+            try:
+                value = future.result()
+            except Exception as e:
+                print(f"❌ Ошибка обработки {path}: {e}")
+                if kind == "extract" and pending_pages.pop(path, None) is not None:
+                    # Остальные диапазоны книги игнорируются, страницы читает сам разбор
+                    print(f"↩️ {os.path.basename(path)}: разбор целиком одной задачей")
+                    futures[pool.submit(parse_book_task, path, None, cache_dir)] = ("parse", path)
+                continue
+
+            if kind == "parse":
+                stats[path]["result"], stats[path]["parse"] = value
+                finish_book(path, stats[path]["result"], out_dir)
+                continue
+
+            if path not in pending_pages:
+                continue  # другой диапазон этой книги уже упал, книга разбирается целиком
+            texts, left = pending_pages[path]
+            start, part, spent = value
+            texts[start:start + len(part)] = part
+            stats[path]["extract"] += spent
+            left -= 1
+            pending_pages[path] = (texts, left)
+            if left == 0:
+                del pending_pages[path]
+                futures[pool.submit(parse_book_task, path, texts, cache_dir)] = ("parse", path)
+
+    return stats
+
+
 def main():
-    folder = r"D:\Work\MIFI\Hakhathon\Books\ML_Python"
+    parser = argparse.ArgumentParser(
+        description="Разбор PDF-книг в JSON по страницам «Содержание»")
+    parser.add_argument("--folder", default=DEFAULT_FOLDER, help="папка с PDF")
+    parser.add_argument("--out_dir", default=None, help="куда писать JSON (по умолчанию — в папку с PDF)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="число процессов (1 — последовательно)")
+    parser.add_argument("--pages_per_task", type=int, default=PAGES_PER_TASK)
+    parser.add_argument("--page_cache", default=None,
+                        help="папка кэша текста страниц (ключ — sha256 PDF)")
+    args = parser.parse_args()
+
+    folder = args.folder
     if not os.path.isdir(folder):
         print("Папка не существует.")
         return
+    out_dir = args.out_dir or folder
+    os.makedirs(out_dir, exist_ok=True)
 
-    pdf_files = [f for f in os.listdir(folder) if f.lower().endswith('.pdf')]
+    pdf_files = sorted(f for f in os.listdir(folder) if f.lower().endswith('.pdf'))
     if not pdf_files:
         print("PDF не найдены.")
         return
 
-    print(f"Обнаружено {len(pdf_files)} PDF. Начинаю обработку...\n")
+    print(f"Обнаружено {len(pdf_files)} PDF. Начинаю обработку ({args.workers} проц.)...\n")
+    pdf_paths = [os.path.join(folder, pdf) for pdf in pdf_files]
+
+    started = time.perf_counter()
+    if args.workers > 1:
+        stats = run_parallel(pdf_paths, out_dir, args.workers, args.pages_per_task,
+                             args.page_cache)
+    else:
+        stats = run_sequential(pdf_paths, out_dir, args.page_cache)
+    elapsed = time.perf_counter() - started
 
     success = 0
-    for pdf in pdf_files:
-        path = os.path.join(folder, pdf)
-        print(f"{pdf}...")
-        result = process_book(path)
+    print("\nКнига | извлечение, с | разбор, с | глав")
+    for path in pdf_paths:
+        st = stats[path]
+        result = st["result"]
+        n_top = len(result["chapters"]) if result and result["chapters"] else 0
+        print(f"{os.path.basename(path)} | {st['extract']:.1f} | {st['parse']:.1f} | "
+              f"{n_top if result else '—'}")
         if result:
-            out_path = os.path.join(folder, os.path.splitext(pdf)[0] + ".json")
-            with open(out_path, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
-            n_top = len(result["chapters"]) if result["chapters"] else 0
-            print(f"{os.path.basename(out_path)} — {n_top} глав")
             success += 1
 
-    print(f"Готово! Успешно обработано: {success}/{len(pdf_files)} книг.")
+    cpu_total = sum(st["extract"] + st["parse"] for st in stats.values())
+    print(f"Готово! Успешно обработано: {success}/{len(pdf_files)} книг "
+          f"за {elapsed:.1f} с (сумма по книгам {cpu_total:.1f} с).")
 
 
 if __name__ == "__main__":
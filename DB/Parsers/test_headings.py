@@ -0,0 +1,82 @@
+import os
+import glob
+import copy
+import random
+
+import pytest
+
+import pdfparser
+from pdfparser import (PageTextStore, aggressive_normalize, best_window_match,
+                       build_tree_and_fill, normalized_heading)
+from heading_reference import (load_book, mutate, reference_heading_appears_on_page,
+                               reference_window_match)
+
+
+DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "DataSet")
+# Небольшие книги DataSet: эталонный перебор окон на них занимает секунды
+BOOKS = ["Программирование для нормальных", "Однострочники"]
+THRESHOLDS = (0.95, 0.8, 0.6)
+
+
+def random_text(rnd, length, alphabet):
+    return "".join(rnd.choice(alphabet) for _ in range(length))
+
+
+def near_fragment(page, rnd):
+    """Фрагмент страницы с опечаткой — fuzzy-ветка с положительным исходом"""
+    start = rnd.randrange(len(page))
+    fragment = page[start:start + rnd.randint(2, 60)]
+    return mutate(fragment, rnd) if rnd.random() < 0.7 else fragment
+
+
+def assert_same(page, heading):
+    for threshold in THRESHOLDS:
+        assert best_window_match(page, heading, threshold) == \
+            reference_window_match(page, heading, threshold), (page, heading, threshold)
+
+
+def dataset_book(name):
+    paths = glob.glob(os.path.join(DATASET, glob.escape(name) + "*.json"))
+    if not paths:
+        pytest.skip(f"книги «{name}» нет в DB/DataSet")
+    return load_book(paths[0])
+
+
+# Маленький алфавит даёт повторяющиеся биграммы в окне и заголовке
+@pytest.mark.parametrize("alphabet", ["аб", "абвг", "абвгдежзиклмнопрст0123456789"])
+def test_window_match_random_pairs(alphabet):
+    rnd = random.Random(alphabet)
+    for _ in range(300):
+        page = random_text(rnd, rnd.randint(0, 300), alphabet)
+        if page and rnd.random() < 0.6:
+            heading = near_fragment(page, rnd)
+        else:
+            heading = random_text(rnd, rnd.randint(1, 40), alphabet)
+        assert_same(page, heading)
+
+
+@pytest.mark.parametrize("name", BOOKS)
+def test_window_match_on_dataset_pages(name):
+    texts, entries = dataset_book(name)
+    rnd = random.Random(name)
+    pages = [aggressive_normalize(t) for t in texts if t]
+    headings = [h for h in (normalized_heading(e["title"]) for e in entries) if h]
+    for _ in range(40):
+        page = rnd.choice(pages)
+        if page and rnd.random() < 0.5:
+            heading = near_fragment(page, rnd)
+        else:
+            heading = mutate(rnd.choice(headings), rnd)
+        assert_same(page, heading)
+
+
+@pytest.mark.parametrize("name", BOOKS)
+def test_chapter_boundaries_unchanged(name, monkeypatch):
+    texts, entries = dataset_book(name)
+    tree = build_tree_and_fill(copy.deepcopy(entries), len(texts), PageTextStore(None, texts=texts))
+
+    monkeypatch.setattr(pdfparser, "heading_appears_on_page", reference_heading_appears_on_page)
+    reference = build_tree_and_fill(copy.deepcopy(entries), len(texts),
+                                    PageTextStore(None, texts=texts))
+
+    assert tree == reference
@@ -4,6 +4,15 @@ export default {
   getTopics(params) {
     return client.get('/topics', { params })
   },
+  getTopicSummaries(params) {
+    return client.get('/topics/summary', { params })
+  },
+  searchTopics(q, params = {}) {
+    return client.get('/topics/search', { params: { q, ...params } })
+  },
+  getTopicContent(id) {
+    return client.get(`/topics/${id}/content`)
+  },
   getTopic(id) {
     return client.get(`/topics/${id}`)
   }
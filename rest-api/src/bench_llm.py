@@ -0,0 +1,63 @@
+import os
+import asyncio
+import argparse
+import chromadb
+from bench_retrieval import load_testset, percentile, sample_from_index
+from lib.llm_client import OLLAMA_KEEP_ALIVE, generate_with_stats
+from lib.rag import build_prompt, build_context, retrieve_async
+
+
+def build_prompts(items, collection, k: int):
+    """Промпты чата как в API: поиск, сборка контекста, build_prompt"""
+    async def build():
+        prompts = []
+        for question, _, _ in items:
+            retrieved = await retrieve_async(question, collection, k=k)
+            prompts.append(build_prompt(question, build_context(retrieved)))
+        return prompts
+    return asyncio.run(build())
+
+
+def run(prompts, keep_alive):
+    rows = []
+    print(" # | загрузка, мс | префилл: токенов / мс | генерация: токенов / мс | ток/с")
+    for i, prompt in enumerate(prompts, start=1):
+        stats = generate_with_stats(prompt, profile="chat", keep_alive=keep_alive)
+        rows.append(stats)
+        print(f"{i:>2} | {stats['load_ms']:>8.0f} | {stats['prefill_tokens']:>5} / {stats['prefill_ms']:>7.0f} | "
+              f"{stats['decode_tokens']:>5} / {stats['decode_ms']:>7.0f} | {stats['decode_tps']:.1f}")
+
+    # Первый запрос может включать загрузку модели и префилл общего префикса
+    warm = rows[1:] or rows
+    for name in ("load_ms", "prefill_ms", "prefill_tokens", "decode_ms"):
+        values = [r[name] for r in warm]
+        print(f"{name:>14}: p50={percentile(values, 0.5):.0f} p95={percentile(values, 0.95):.0f}")
+    prefill = sum(r["prefill_ms"] for r in warm)
+    decode = sum(r["decode_ms"] for r in warm)
+    print(f"Доля префилла во времени генерации: {prefill / max(prefill + decode, 1e-9):.1%}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Префилл и генерация Ollama на промптах чата (по статистике ответа Ollama)')
+    parser.add_argument('--testset', default=os.path.join(
+        os.path.dirname(__file__), '..', '..', 'RAG-Test', 'generated_questions_detailed.csv'))
+    parser.add_argument('--from-index', type=int, default=0,
+                        help='вместо тестсета взять N запросов из случайных чанков индекса')
+    parser.add_argument('--n', type=int, default=10, help='сколько запросов прогнать')
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--keep_alive', default=OLLAMA_KEEP_ALIVE,
+                        help='keep_alive для замера (0 — выгружать модель после каждого запроса)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=os.environ.get('CHROMA_DIR', './db'))
+    collection = client.get_collection('cloud_docs')
+
+    if args.from_index:
+        items = sample_from_index(collection, args.from_index, args.seed)
+    else:
+        items = load_testset(args.testset)
+    items = items[:args.n]
+    print(f"Запросов: {len(items)}, keep_alive={args.keep_alive}")
+    run(build_prompts(items, collection, args.k), args.keep_alive)
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import argparse
+from lib.moderation_lexicon import ObsceneLexicon
+from lib.swear_detector import RussianSwearDetector
+
+
+def load_corpus(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def precision_recall(pairs):
+    """pairs: [(предсказание, метка)]"""
+    tp = sum(1 for p, y in pairs if p and y)
+    fp = sum(1 for p, y in pairs if p and not y)
+    fn = sum(1 for p, y in pairs if not p and y)
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    return precision, recall
+
+
+def run(corpus_path: str, use_llm: bool, use_ngrams: bool, threshold: float, model: str):
+    corpus = load_corpus(corpus_path)
+    detector = RussianSwearDetector(
+        model_name=model,
+        lexicon=ObsceneLexicon(use_ngrams=use_ngrams, ngram_threshold=threshold)
+    )
+
+    baseline_llm_calls = 0
+    llm_calls = 0
+    local_pairs = []
+    final_pairs = []
+    local_times = []
+    by_tier = {}
+
+    for item in corpus:
+        text, label = item['text'], bool(item['label'])
+
+        # Было: regex → LLM на каждый промах regex
+        regex_found, _ = detector.regex_check(text)
+        if not regex_found:
+            baseline_llm_calls += 1
+
+        # Стало: regex → словарь → LLM только для неоднозначных
+        t0 = time.perf_counter()
+        result, _ = detector.local_check(text)
+        local_times.append((time.perf_counter() - t0) * 1000)
+
+        if result is not None:
+            tier = result['method']
+            predicted = result['has_swear']
+            local_pairs.append((predicted, label))
+        else:
+            tier = 'ai'
+            llm_calls += 1
+            # Без --llm считаем модель идеальной: оцениваем только локальные уровни
+            predicted = detector.ai_check(text) if use_llm else label
+
+        by_tier[tier] = by_tier.get(tier, 0) + 1
+        final_pairs.append((predicted, label))
+
+    local_p, local_r = precision_recall(local_pairs)
+    final_p, final_r = precision_recall(final_pairs)
+    local_times.sort()
+    p50 = local_times[len(local_times) // 2]
+    p99 = local_times[min(len(local_times) - 1, int(len(local_times) * 0.99))]
+
+    print(f"Корпус: {corpus_path} ({len(corpus)} сообщений)")
+    print(f"Решения по уровням: {by_tier}")
+    print(f"Вызовов LLM: было {baseline_llm_calls}, стало {llm_calls} "
+          f"(сэкономлено {baseline_llm_calls - llm_calls})")
+    print(f"Локальные уровни: precision={local_p:.3f} recall={local_r:.3f} "
+          f"на {len(local_pairs)} решённых без LLM")
+    print(f"Итого{'' if use_llm else ' (LLM = эталон)'}: "
+          f"precision={final_p:.3f} recall={final_r:.3f}")
+    print(f"Время локальной проверки: p50={p50:.3f} мс, p99={p99:.3f} мс")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Бенчмарк уровней модерации на размеченном корпусе')
+    parser.add_argument('--corpus', default=os.path.join(
+        os.path.dirname(__file__), 'bench_data', 'moderation_corpus.jsonl'))
+    parser.add_argument('--llm', action='store_true',
+                        help='реально вызывать ai_check для неоднозначных')
+    parser.add_argument('--no-ngrams', action='store_true')
+    parser.add_argument('--threshold', type=float, default=0.75)
+    parser.add_argument('--model', default='mistral')
+    args = parser.parse_args()
+    run(args.corpus, args.llm, not args.no_ngrams, args.threshold, args.model)
@@ -0,0 +1,120 @@
+import os
+import ast
+import time
+import random
+import asyncio
+import argparse
+import chromadb
+import pandas as pd
+from lib.rag import (embeddings, ensure_lexical_index, retrieve_docs_with_embeddings_async,
+                     retrieve_hybrid_async)
+from lib.reranker import RERANK_CANDIDATES, get_reranker, rerank_async
+
+
+def load_testset(path: str):
+    """Вопросы RAG-Test: (вопрос, url источника, номер чанка)"""
+    df = pd.read_csv(path)
+    items = []
+    for _, row in df.iterrows():
+        try:
+            meta = ast.literal_eval(row['metadata']) if isinstance(row['metadata'], str) else {}
+        except (ValueError, SyntaxError):
+            meta = {}
+        if meta.get('url'):
+            items.append((row['question'], meta['url'], meta.get('chunk_id')))
+    return items
+
+
+def sample_from_index(collection, n: int, seed: int):
+    """Без тестсета: предложение из случайного чанка как запрос, сам чанк — эталон"""
+    res = collection.get(include=["documents", "metadatas"])
+    rnd = random.Random(seed)
+    pairs = list(zip(res["documents"], res["metadatas"]))
+    rnd.shuffle(pairs)
+    items = []
+    for doc, meta in pairs:
+        sentences = [s.strip() for s in doc.replace('\n', ' ').split('. ') if len(s.split()) >= 6]
+        if sentences:
+            items.append((rnd.choice(sentences), meta.get('url'), meta.get('chunk_id')))
+        if len(items) >= n:
+            break
+    return items
+
+
+def hit_rank(retrieved, url: str, chunk_id):
+    """Позиция эталонного чанка (с 1) и позиция первого чанка того же документа"""
+    chunk_rank = doc_rank = None
+    for rank, meta in enumerate(retrieved["metadatas"], start=1):
+        meta = meta or {}
+        if meta.get('url') != url:
+            continue
+        doc_rank = doc_rank or rank
+        if chunk_id is None or meta.get('chunk_id') == chunk_id:
+            chunk_rank = chunk_rank or rank
+    return chunk_rank, doc_rank
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+async def run(items, collection, k: int, dense_k: int, lexical_k: int):
+    modes = {
+        "dense": lambda q: retrieve_docs_with_embeddings_async(q, collection, embeddings, k=k),
+        "hybrid": lambda q: retrieve_hybrid_async(q, collection, k=k,
+                                                  dense_k=dense_k, lexical_k=lexical_k),
+    }
+    if get_reranker() is not None:
+        get_reranker().warm_up()  # до загрузки модели rerank_async пропускает стадию
+
+        async def hybrid_rerank(q):
+            retrieved = await retrieve_hybrid_async(q, collection, k=max(k, RERANK_CANDIDATES),
+                                                    dense_k=dense_k, lexical_k=lexical_k)
+            return await rerank_async(q, retrieved, k)
+        modes["rerank"] = hybrid_rerank
+    # Прогрев модели, чтобы первая загрузка не попала в замер
+    await modes["dense"](items[0][0])
+
+    for name, retrieve in modes.items():
+        times, chunk_hits, doc_hits, rr = [], 0, 0, 0.0
+        for question, url, chunk_id in items:
+            t0 = time.perf_counter()
+            retrieved = await retrieve(question)
+            times.append((time.perf_counter() - t0) * 1000)
+            chunk_rank, doc_rank = hit_rank(retrieved, url, chunk_id)
+            chunk_hits += chunk_rank is not None
+            doc_hits += doc_rank is not None
+            rr += 1.0 / chunk_rank if chunk_rank else 0.0
+
+        n = len(items)
+        print(f"{name:>6}: recall@{k} чанк={chunk_hits / n:.3f} документ={doc_hits / n:.3f} "
+              f"MRR={rr / n:.3f} | p50={percentile(times, 0.5):.1f} мс "
+              f"p95={percentile(times, 0.95):.1f} мс")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Сравнение плотного, гибридного поиска и переранжирования на вопросах RAG-Test')
+    parser.add_argument('--testset', default=os.path.join(
+        os.path.dirname(__file__), '..', '..', 'RAG-Test', 'generated_questions_detailed.csv'))
+    parser.add_argument('--from-index', type=int, default=0,
+                        help='вместо тестсета взять N запросов из случайных чанков индекса')
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--dense_k', type=int, default=10)
+    parser.add_argument('--lexical_k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=os.environ.get('CHROMA_DIR', './db'))
+    collection = client.get_collection('cloud_docs')
+    ensure_lexical_index(client)
+
+    if args.from_index:
+        items = sample_from_index(collection, args.from_index, args.seed)
+    else:
+        items = load_testset(args.testset)
+    print(f"Запросов: {len(items)}")
+    asyncio.run(run(items, collection, args.k, args.dense_k, args.lexical_k))
+    if get_reranker() is not None:
+        print(get_reranker().stats())
@@ -5,10 +5,14 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 import chromadb
 from chromadb.config import Settings
 import os
-import uuid
+import time
+import hashlib
 import torch
+from lib.lexical_index import LexicalIndex, LEXICAL_INDEX_NAME
 
 
+CHECKPOINT_NAME = 'build_index.checkpoint.json'
+MANIFEST_NAME = 'build_index.manifest.json'
 
 
 def clean_text(t: str) -> str:
@@ -21,9 +25,152 @@ def clean_text(t: str) -> str:
     return t
 
 
+def chunk_id(url: str, idx: int, chunk: str) -> str:
+    """Детерминированный id чанка: повторный запуск обновляет, а не дублирует"""
+    return hashlib.sha256(f"{url}\n{idx}\n{chunk}".encode('utf-8')).hexdigest()[:32]
 
 
-def build_index(input_path: str, persist_dir: str):
+def make_splitter():
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        separators=["\n## ", "\n### ", "\n\n", "\n", ". "]
+    )
+
+
+def record_chunks(rec: dict, splitter):
+    """Чанки одной записи JSONL: [(id, текст, метаданные)]"""
+    content = rec.get('content') or ''
+    title = rec.get('title') or ''
+    url = rec.get('url') or ''
+    section = rec.get('section') or ''
+    source = rec.get('source') or ''
+    timestamp = rec.get('timestamp') or ''
+
+    text = clean_text(content)
+    chunks = splitter.split_text(text)
+
+    result = []
+    for idx, chunk in enumerate(chunks):
+        metadata = {
+            'url': url,
+            'title': title,
+            'section': section,
+            'source': source,
+            'timestamp': timestamp,
+            'chunk_id': idx,
+            'total_chunks': len(chunks)
+        }
+        result.append((chunk_id(url, idx, chunk), chunk, metadata))
+    return result
+
+
+def document_key(rec: dict) -> str:
+    """Ключ документа в манифесте"""
+    return rec.get('url') or rec.get('title') or ''
+
+
+def accept_document(key: str, seen: set, line_no: int) -> bool:
+    """
+    Общее правило полной и инкрементальной сборки: запись без ключа
+    пропускается, из записей с одинаковым ключом индексируется первая.
+    """
+    if not key:
+        return False
+    if key in seen:
+        print(f'Line {line_no}: duplicate document {key}, skipped')
+        return False
+    seen.add(key)
+    return True
+
+
+def delete_chunks(collection, lexical, ids) -> None:
+    if ids:
+        collection.delete(ids=ids)
+        lexical.delete(ids)
+
+
+def document_hash(rec: dict) -> str:
+    """Хэш очищенного содержимого (и полей, попадающих в метаданные чанков)"""
+    payload = "\n".join([
+        rec.get('title') or '',
+        rec.get('section') or '',
+        rec.get('source') or '',
+        rec.get('timestamp') or '',
+        clean_text(rec.get('content') or '')
+    ])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def iter_records(input_path: str, start_line: int = 0):
+    """Потоковое чтение JSONL: (номер строки, запись), без загрузки файла целиком"""
+    with open(input_path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, start=1):
+            if line_no <= start_line or not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except json.JSONDecodeError:
+                print(f'Line {line_no}: invalid JSON')
+
+
+def upsert_batch(collection, emb_model, batch, encode_batch_size: int, lexical=None):
+    """Один батч: кодирование пачкой и массовый upsert в Chroma (и в BM25-индекс)"""
+    ids = [item[0] for item in batch]
+    docs = [item[1] for item in batch]
+    metas = [item[2] for item in batch]
+    embs = emb_model.encode(
+        docs,
+        batch_size=encode_batch_size,
+        show_progress_bar=False,
+        convert_to_numpy=True,
+        normalize_embeddings=True
+    ).tolist()
+    collection.upsert(ids=ids, documents=docs, embeddings=embs, metadatas=metas)
+    if lexical is not None:
+        lexical.upsert(batch)
+
+
+# ---------- manifest ----------
+
+def load_manifest(path: str) -> dict:
+    """Манифест индекса: {ключ документа: {"hash": ..., "chunk_ids": [...]}}"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(path: str, manifest: dict) -> None:
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+# ---------- checkpoint ----------
+
+def load_checkpoint(path: str, input_path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    # Чекпоинт относится к другому файлу или файл изменился — начинаем заново
+    if state.get('input') != os.path.abspath(input_path) or \
+            state.get('input_size') != os.path.getsize(input_path):
+        return {}
+    return state
+
+
+def save_checkpoint(path: str, state: dict) -> None:
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def build_index(input_path: str, persist_dir: str, batch_size: int = 256,
+                encode_batch_size: int = 32, restart: bool = False):
     print('Load model...')
     device = 'cuda' if torch.cuda.is_available() else 'cpu'
     emb_model = SentenceTransformer('intfloat/multilingual-e5-large', device=device)
@@ -31,62 +178,176 @@ def build_index(input_path: str, persist_dir: str):
     print('Init chroma...')
     client = chromadb.PersistentClient(path=persist_dir)
     collection = client.get_or_create_collection(name='cloud_docs')
+    lexical = LexicalIndex(os.path.join(persist_dir, LEXICAL_INDEX_NAME))
 
-    with open(input_path, 'r', encoding='utf-8') as f:
-        data = [json.loads(line) for line in f if line.strip()]
+    checkpoint_path = os.path.join(persist_dir, CHECKPOINT_NAME)
+    manifest_path = os.path.join(persist_dir, MANIFEST_NAME)
+    state = {} if restart else load_checkpoint(checkpoint_path, input_path)
+    start_line = state.get('line', 0)
+    added = state.get('added', 0)
+    # Манифест прошлой сборки: по нему удаляются чанки изменённых и исчезнувших
+    # документов; он же нужен последующим инкрементальным запускам (--incremental)
+    manifest = load_manifest(manifest_path)
+    seen = set()
+    if start_line:
+        print(f'Resume from line {start_line + 1} ({added} chunks already indexed)')
+        for line_no, rec in iter_records(input_path):
+            if line_no > start_line:
+                break
+            if document_key(rec):
+                seen.add(document_key(rec))
 
+    splitter = make_splitter()
+    started = time.perf_counter()
+    session_added = 0
+    batch = []
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        separators=["\n## ", "\n### ", "\n\n", "\n", ". "]
-    )
+    def flush(last_line: int):
+        nonlocal added, session_added, batch
+        if batch:
+            upsert_batch(collection, emb_model, batch, encode_batch_size, lexical)
+            added += len(batch)
+            session_added += len(batch)
+            batch = []
+        # Чекпоинт только на границе записей: все чанки до last_line уже в Chroma
+        save_manifest(manifest_path, manifest)
+        save_checkpoint(checkpoint_path, {
+            'input': os.path.abspath(input_path),
+            'input_size': os.path.getsize(input_path),
+            'line': last_line,
+            'added': added
+        })
+        rate = session_added / max(time.perf_counter() - started, 1e-9)
+        print(f'line {last_line}: {added} chunks ({rate:.1f} chunks/s)')
 
-    added = 0
-    for rec in data:
-        content = rec.get('content') or ''
-        title = rec.get('title') or ''
-        url = rec.get('url') or ''
-        section = rec.get('section') or ''
-        source = rec.get('source') or ''
-        timestamp = rec.get('timestamp') or ''
-
-        text = clean_text(content)
-        chunks = splitter.split_text(text)
-
-        for idx, chunk in enumerate(chunks):
-            doc_id = f"{uuid.uuid4()}"
-            metadata = {
-                'url': url,
-                'title': title,
-                'section': section,
-                'source': source,
-                'timestamp': timestamp,
-                'chunk_id': idx,
-                'total_chunks': len(chunks)
-            }
-            emb = emb_model.encode(chunk).tolist()
-            try:
-                collection.add(
-                    documents=[chunk],
-                    embeddings=[emb],
-                    metadatas=[metadata],
-                    ids=[doc_id]
-                )
-                added += 1
-            except Exception as e:
-                print('Add error', e)
+    last_line = start_line
+    for line_no, rec in iter_records(input_path, start_line):
+        last_line = line_no
+        key = document_key(rec)
+        if not accept_document(key, seen, line_no):
+            continue
+        chunks = record_chunks(rec, splitter)
+        new_ids = [c[0] for c in chunks]
+        old = manifest.get(key)
+        if old:
+            delete_chunks(collection, lexical, list(set(old['chunk_ids']) - set(new_ids)))
+        batch.extend(chunks)
+        manifest[key] = {'hash': document_hash(rec), 'chunk_ids': new_ids}
+        if len(batch) >= batch_size:
+            flush(last_line)
+    flush(last_line)
 
+    # Документы прошлой сборки, которых больше нет во входном файле
+    removed = [k for k in manifest if k not in seen]
+    for key in removed:
+        delete_chunks(collection, lexical, manifest.pop(key)['chunk_ids'])
+    if removed:
+        save_manifest(manifest_path, manifest)
+        print(f'Removed {len(removed)} documents missing from {input_path}')
 
+    # Индекс построен полностью — следующий запуск пройдёт файл заново (upsert идемпотентен)
+    os.remove(checkpoint_path)
     print(f'Added {added} chunks to Chroma at {persist_dir}')
 
 
+def update_index(input_path: str, persist_dir: str, batch_size: int = 256,
+                 encode_batch_size: int = 32) -> dict:
+    """
+    Инкрементальное обновление по манифесту: эмбеддинги считаются только для
+    новых/изменённых документов (и только для их новых чанков), чанки удалённых
+    документов стираются, остальное не трогается.
+    """
+    manifest_path = os.path.join(persist_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    if not manifest:
+        print('Manifest not found — run a full build first')
+        return {}
+
+    print('Load model...')
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    emb_model = SentenceTransformer('intfloat/multilingual-e5-large', device=device)
+
+    print('Init chroma...')
+    client = chromadb.PersistentClient(path=persist_dir)
+    collection = client.get_or_create_collection(name='cloud_docs')
+    lexical = LexicalIndex(os.path.join(persist_dir, LEXICAL_INDEX_NAME))
+
+    splitter = make_splitter()
+    report = {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 0,
+              'chunks_embedded': 0, 'chunks_deleted': 0}
+    seen = set()
+    batch = []
+
+    def flush():
+        nonlocal batch
+        if batch:
+            upsert_batch(collection, emb_model, batch, encode_batch_size, lexical)
+            report['chunks_embedded'] += len(batch)
+            batch = []
+        save_manifest(manifest_path, manifest)
+
+    for line_no, rec in iter_records(input_path):
+        key = document_key(rec)
+        if not accept_document(key, seen, line_no):
+            continue
+
+        doc_hash = document_hash(rec)
+        old = manifest.get(key)
+        if old and old['hash'] == doc_hash:
+            report['unchanged'] += 1
+            continue
+
+        chunks = record_chunks(rec, splitter)
+        new_ids = [c[0] for c in chunks]
+        old_ids = set(old['chunk_ids']) if old else set()
+
+        # id чанка — хэш его текста и позиции: совпавшие чанки не пересчитываем,
+        # только обновляем метаданные (total_chunks мог измениться)
+        stale = list(old_ids - set(new_ids))
+        delete_chunks(collection, lexical, stale)
+        report['chunks_deleted'] += len(stale)
+        kept = [c for c in chunks if c[0] in old_ids]
+        if kept:
+            collection.update(ids=[c[0] for c in kept], metadatas=[c[2] for c in kept])
+            lexical.upsert(kept)
+        batch.extend(c for c in chunks if c[0] not in old_ids)
+
+        manifest[key] = {'hash': doc_hash, 'chunk_ids': new_ids}
+        report['changed' if old else 'added'] += 1
+        if len(batch) >= batch_size:
+            flush()
+
+    # Документы, которых больше нет во входном файле
+    for key in [k for k in manifest if k not in seen]:
+        ids = manifest.pop(key)['chunk_ids']
+        delete_chunks(collection, lexical, ids)
+        report['chunks_deleted'] += len(ids)
+        report['removed'] += 1
+
+    flush()
+    print(f"Documents: added {report['added']}, changed {report['changed']}, "
+          f"removed {report['removed']}, unchanged {report['unchanged']}")
+    print(f"Chunks: embedded {report['chunks_embedded']}, deleted {report['chunks_deleted']}")
+    return report
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--input', required=True)
     parser.add_argument('--persist_dir', default='./db')
+    parser.add_argument('--batch_size', type=int, default=256,
+                        help='чанков на один upsert')
+    parser.add_argument('--encode_batch_size', type=int, default=32,
+                        help='размер батча forward-прохода модели')
+    parser.add_argument('--restart', action='store_true',
+                        help='игнорировать чекпоинт и начать с начала')
+    parser.add_argument('--incremental', action='store_true',
+                        help='обновить только изменившиеся документы по манифесту')
     args = parser.parse_args()
     os.makedirs(args.persist_dir, exist_ok=True)
-    build_index(args.input, args.persist_dir)
\ No newline at end of file
+    if args.incremental:
+        update_index(args.input, args.persist_dir, args.batch_size,
+                     args.encode_batch_size)
+    else:
+        build_index(args.input, args.persist_dir, args.batch_size,
+                    args.encode_batch_size, args.restart)
@@ -1,10 +1,11 @@
 # rest-api\src\crud.py
 from datetime import datetime
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from typing import List, Optional
-import random
-from models import User, Topic, Question, UserProgress, TestSession, TestAnswer
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, select, insert, update
+from typing import Dict, List, Optional, Tuple
+from models import (User, Topic, Question, UserProgress, TestSession, TestAnswer,
+                    TestSessionQuestion, new_random_key)
 from lib.schemas import UserCreate, TopicCreate, QuestionCreate, UserProgressCreate
 from auth import get_password_hash
 
@@ -38,6 +39,29 @@ def get_topics(db: Session, skip: int = 0, limit: int = 100):
     return db.query(Topic).filter(Topic.is_available == True).offset(skip).limit(limit).all()
 
 
+def get_topic_summaries(db: Session, after_id: int = 0, limit: int = 100):
+    """Страница тем для списка: keyset-пагинация по id, колонка json не читается"""
+    return (
+        db.query(Topic)
+        .options(load_only(Topic.id, Topic.title, Topic.description, Topic.image,
+                           Topic.is_available, Topic.created_at))
+        .filter(Topic.is_available == True, Topic.id > after_id)
+        .order_by(Topic.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def get_topic_content(db: Session, topic_id: int):
+    """Только содержимое темы (json) — для ленивой загрузки"""
+    return (
+        db.query(Topic)
+        .options(load_only(Topic.id, Topic.json))
+        .filter(Topic.id == topic_id)
+        .first()
+    )
+
+
 def get_topic(db: Session, topic_id: int):
     return db.query(Topic).filter(Topic.id == topic_id).first()
 
@@ -53,14 +77,73 @@ def create_topic(db: Session, topic: TopicCreate):
     db.refresh(db_topic)
     return db_topic
 
+
+def get_topic_hashes(db: Session) -> Dict[str, Tuple[int, Optional[str]]]:
+    """title -> (id, content_hash) для всех тем, без загрузки тяжёлых колонок"""
+    rows = db.execute(select(Topic.title, Topic.id, Topic.content_hash))
+    return {title: (topic_id, content_hash) for title, topic_id, content_hash in rows}
+
+
+def bulk_create_topics(db: Session, topics: List[dict]) -> List[int]:
+    """Массовая вставка тем одним executemany, без commit; возвращает id в порядке topics"""
+    if not topics:
+        return []
+    result = db.execute(
+        insert(Topic).returning(Topic.id, sort_by_parameter_order=True), topics)
+    return list(result.scalars())
+
+
+def bulk_update_topics(db: Session, topics: List[dict]):
+    """Массовое обновление тем по id (в каждом словаре есть ключ "id"), без commit"""
+    if topics:
+        db.execute(update(Topic), topics)
+
 # Question CRUD
 
 
 def get_questions_by_topic(db: Session, topic_id: int, limit: int = 4):
-    questions = db.query(Question).filter(Question.topic_id == topic_id).all()
-    if len(questions) > limit:
-        return random.sample(questions, limit)
-    return questions
+    return sample_questions(db, topic_id=topic_id, limit=limit)
+
+
+def count_questions(db: Session, topic_id: int) -> int:
+    return db.query(func.count(Question.id)).filter(Question.topic_id == topic_id).scalar()
+
+
+def get_question_texts(db: Session, topic_id: int) -> List[str]:
+    return list(db.scalars(select(Question.question_text).where(Question.topic_id == topic_id)))
+
+
+def bulk_create_questions(db: Session, topic_id: int, questions: List[Dict]) -> int:
+    """Массовая вставка вопросов темы (без commit); возвращает число строк"""
+    if not questions:
+        return 0
+    db.execute(insert(Question), [
+        {**q, "topic_id": topic_id, "random_key": new_random_key()} for q in questions
+    ])
+    return len(questions)
+
+
+def sample_questions(db: Session, topic_id: int, limit: int = 4, exclude: Tuple[int, ...] = ()):
+    """
+    Случайные вопросы темы без загрузки всего банка: для каждого вопроса —
+    поиск по индексу (topic_id, random_key) от случайной точки, с переходом в начало.
+    """
+    chosen: List[Question] = []
+    skip = set(exclude)
+    for _ in range(limit):
+        point = new_random_key()
+        base = db.query(Question).filter(Question.topic_id == topic_id)
+        if skip:
+            base = base.filter(Question.id.notin_(skip))
+        question = (
+            base.filter(Question.random_key >= point).order_by(Question.random_key).first()
+            or base.filter(Question.random_key < point).order_by(Question.random_key).first()
+        )
+        if question is None:
+            break
+        chosen.append(question)
+        skip.add(question.id)
+    return chosen
 
 
 def create_question(db: Session, question: QuestionCreate):
@@ -114,6 +197,52 @@ def get_test_session(db: Session, session_id: int, user_id: Optional[int] = None
     return query.first()
 
 
+def get_session_questions(db: Session, session_id: int) -> List[Question]:
+    """Вопросы сессии в порядке показа"""
+    return (
+        db.query(Question)
+        .join(TestSessionQuestion, TestSessionQuestion.question_id == Question.id)
+        .filter(TestSessionQuestion.test_session_id == session_id)
+        .order_by(TestSessionQuestion.position)
+        .all()
+    )
+
+
+def assign_session_questions(db: Session, test_session: TestSession, limit: int = 4) -> List[Question]:
+    """
+    Закрепляет за сессией до limit вопросов темы. Если при старте вопросов
+    было меньше (догенерируются в фоне), недостающие добираются при следующем вызове.
+    Повторный или параллельный вызов безопасен: занятые позиции не перезаписываются.
+    """
+    questions = get_session_questions(db, test_session.id)
+    if len(questions) >= limit:
+        return questions
+
+    added = sample_questions(
+        db, topic_id=test_session.topic_id, limit=limit - len(questions),
+        exclude=tuple(q.id for q in questions))
+    if not added:
+        return questions
+
+    # Позицию мог уже занять параллельный запрос — такая строка пропускается
+    result = db.execute(
+        insert(TestSessionQuestion.__table__).prefix_with("OR IGNORE"),
+        [{"test_session_id": test_session.id, "position": len(questions) + i, "question_id": q.id}
+         for i, q in enumerate(added)]
+    )
+    if result.rowcount:
+        # Новый ключ выбранным вопросам: иначе вопросы после больших промежутков
+        # между ключами выпадали бы заметно чаще остальных
+        db.execute(
+            update(Question)
+            .where(Question.id.in_([q.id for q in added]))
+            .values(random_key=func.abs(func.random()) % 2147483648)
+            .execution_options(synchronize_session=False)
+        )
+    db.commit()
+    return get_session_questions(db, test_session.id)
+
+
 def complete_test_session(db: Session, session_id: int, score: int):
     db_session = db.query(TestSession).filter(
         TestSession.id == session_id).first()
@@ -123,3 +252,35 @@ def complete_test_session(db: Session, session_id: int, score: int):
         db.commit()
         db.refresh(db_session)
     return db_session
+
+
+# Async CRUD (неблокирующие эндпоинты)
+
+
+async def aget_topic(db: AsyncSession, topic_id: int):
+    result = await db.execute(select(Topic).where(Topic.id == topic_id))
+    return result.scalars().first()
+
+
+async def aget_user_progress(db: AsyncSession, user_id: int, topic_id: int):
+    result = await db.execute(select(UserProgress).where(
+        and_(UserProgress.user_id == user_id,
+             UserProgress.topic_id == topic_id)
+    ).order_by(UserProgress.created_at))
+    return result.scalars().all()
+
+
+async def acreate_user_progress(db: AsyncSession, progress: UserProgressCreate, user_id: int):
+    db_progress = UserProgress(**progress.dict(), user_id=user_id)
+    db.add(db_progress)
+    await db.commit()
+    await db.refresh(db_progress)
+    return db_progress
+
+
+async def acreate_question(db: AsyncSession, question: QuestionCreate):
+    db_question = Question(**question.dict())
+    db.add(db_question)
+    await db.commit()
+    await db.refresh(db_question)
+    return db_question
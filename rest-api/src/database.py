@@ -1,7 +1,8 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
 
 sql_path = os.environ.get('SQL_PATH', './ai_tutor.sql')
@@ -13,6 +14,13 @@ engine = create_engine(
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронный движок для неблокирующих эндпоинтов (чат, генерация)
+ASYNC_SQLALCHEMY_DATABASE_URL = f'sqlite+aiosqlite:///{sql_path}'
+
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
@@ -24,6 +32,51 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def create_db_and_tables() -> None:
     """Создание базы данных и всех таблиц"""
     Base.metadata.create_all(engine)
+
+
+# Колонки, добавленные в модели после первых релизов: create_all не меняет
+# существующие таблицы, поэтому на старых базах добавляем их сами
+ADDED_COLUMNS = {
+    "topics": {
+        "content_hash": "VARCHAR(64)",
+    },
+    "questions": {
+        "random_key": "INTEGER",
+    },
+}
+
+# Значения для строк, созданных до появления колонки (SQL-выражение)
+COLUMN_BACKFILL = {
+    "questions": {
+        "random_key": "abs(random()) % 2147483648",
+    },
+}
+
+
+def ensure_columns() -> None:
+    """
+    ALTER TABLE ... ADD COLUMN для колонок, которых нет в существующей базе,
+    заполнение их по COLUMN_BACKFILL и создание индексов модели на этих таблицах
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, columns in ADDED_COLUMNS.items():
+            if not inspector.has_table(table):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            for name, ddl in columns.items():
+                if name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+            for name, value in COLUMN_BACKFILL.get(table, {}).items():
+                conn.execute(text(f"UPDATE {table} SET {name} = {value} WHERE {name} IS NULL"))
+            if table in Base.metadata.tables:
+                for index in Base.metadata.tables[table].indexes:
+                    index.create(bind=conn, checkfirst=True)
@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Настройки модулей lib читаются при импорте — .env загружается до них
+load_dotenv()
+
+from sqlalchemy import func, select
+from database import SessionLocal, engine, ensure_columns
+import models
+from lib.concurrency import STAGE_LIMITS
+from lib.question_pool import QUESTION_POOL_BATCH, QUESTION_POOL_MIN, fill_topic_to
+
+
+def load_failed(path: str) -> set:
+    """id тем из журнала ошибок прошлых запусков"""
+    if not os.path.exists(path):
+        return set()
+    failed = set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                failed.add(json.loads(line)["topic_id"])
+            except (json.JSONDecodeError, KeyError):
+                continue
+    return failed
+
+
+def select_topics(db, args, skip: set):
+    """(id, заголовок) тем, где вопросов меньше целевого числа — одним запросом"""
+    query = (
+        select(models.Topic.id, models.Topic.title)
+        .outerjoin(models.Question, models.Question.topic_id == models.Topic.id)
+        .where(models.Topic.json.is_not(None))
+        .group_by(models.Topic.id)
+        .having(func.count(models.Question.id) < args.target)
+        .order_by(models.Topic.id)
+    )
+    if args.topic_ids:
+        query = query.where(models.Topic.id.in_(args.topic_ids))
+    if args.title:
+        query = query.where(models.Topic.title.like(f"%{args.title}%"))
+    topics = [(topic_id, title) for topic_id, title in db.execute(query) if topic_id not in skip]
+    return topics[:args.limit] if args.limit else topics
+
+
+class Progress:
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.questions = 0
+        self.llm_calls = 0
+        self.t0 = time.perf_counter()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.t0
+        rate = self.done / elapsed if elapsed else 0.0
+        eta = (self.total - self.done) / rate if rate else 0.0
+        print(f"  {self.done}/{self.total} тем (ошибок {self.failed}) | вопросов +{self.questions} | "
+              f"{self.questions / elapsed * 60 if elapsed else 0:.1f} вопр/мин, "
+              f"{self.llm_calls / elapsed * 60 if elapsed else 0:.1f} вызовов LLM/мин | "
+              f"осталось ~{eta / 60:.1f} мин", flush=True)
+
+
+def fill_topic(topic_id: int, args, generate, on_batch) -> int:
+    """Догенерация вопросов одной темы до args.target (в потоке: синхронная сессия БД)"""
+    db = SessionLocal()
+    try:
+        return fill_topic_to(db, topic_id, args.target, generate, batch=args.batch,
+                             max_empty_rounds=args.max_empty_rounds, on_batch=on_batch)
+    finally:
+        db.close()
+
+
+async def run(topics, args):
+    from lib.creater_question import generate_questions_from_book_async
+
+    progress = Progress(len(topics))
+    sem = asyncio.Semaphore(args.concurrency)
+    log = open(args.failures, 'a', encoding='utf-8')
+    loop = asyncio.get_running_loop()
+
+    def generate(num_questions: int, book_json):
+        # Вызывается из потока fill_topic: генерация идёт в основном цикле
+        # под общим лимитом стадии "llm"
+        progress.llm_calls += 1
+        future = asyncio.run_coroutine_threadsafe(
+            generate_questions_from_book_async(num_questions, book_json), loop)
+        try:
+            return future.result(args.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def count(n: int):
+        progress.questions += n
+
+    async def worker(topic_id: int, title: str):
+        async with sem:
+            try:
+                await asyncio.to_thread(fill_topic, topic_id, args, generate, count)
+            except Exception as e:
+                progress.failed += 1
+                timeout = isinstance(e, (asyncio.TimeoutError, FutureTimeoutError))
+                error = "timeout" if timeout else str(e)[:500]
+                log.write(json.dumps({"topic_id": topic_id, "title": title, "error": error,
+                                      "at": datetime.utcnow().isoformat()}, ensure_ascii=False) + "\n")
+                log.flush()
+            progress.done += 1
+            if progress.done % args.report_every == 0 or progress.done == progress.total:
+                progress.report()
+
+    try:
+        await asyncio.gather(*(worker(topic_id, title) for topic_id, title in topics))
+    finally:
+        log.close()
+    return progress
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Пакетная генерация вопросов по всем темам (или выбранным) через Ollama')
+    parser.add_argument('--target', type=int, default=QUESTION_POOL_MIN,
+                        help='сколько вопросов должно быть в теме')
+    parser.add_argument('--batch', type=int, default=QUESTION_POOL_BATCH,
+                        help='вопросов на один вызов модели')
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv("OLLAMA_NUM_PARALLEL", "2")),
+                        help='одновременных запросов к Ollama (не больше OLLAMA_NUM_PARALLEL сервера)')
+    parser.add_argument('--timeout', type=float, default=600.0, help='таймаут одного вызова, с')
+    parser.add_argument('--max_empty_rounds', type=int, default=2,
+                        help='сколько вызовов подряд без новых вопросов допускается на тему')
+    parser.add_argument('--topic_ids', type=int, nargs='*', help='только эти темы')
+    parser.add_argument('--title', help='только темы, в заголовке которых есть строка')
+    parser.add_argument('--limit', type=int, default=0, help='не больше N тем (0 — все)')
+    parser.add_argument('--failures', default='generate_questions.failures.jsonl',
+                        help='журнал ошибок по темам (JSONL)')
+    parser.add_argument('--retry_failed', action='store_true',
+                        help='повторить темы из журнала ошибок (иначе они пропускаются)')
+    parser.add_argument('--report_every', type=int, default=10)
+    args = parser.parse_args()
+
+    # Лимит стадии "llm" внутри генератора не должен быть ниже заданной параллельности
+    STAGE_LIMITS["llm"] = max(STAGE_LIMITS["llm"], args.concurrency)
+
+    models.Base.metadata.create_all(bind=engine)
+    ensure_columns()
+
+    skip = set() if args.retry_failed else load_failed(args.failures)
+    db = SessionLocal()
+    topics = select_topics(db, args, skip)
+    db.close()
+    # Уже заполненные темы отбираются по базе, поэтому прерванный запуск
+    # продолжается повторным вызовом с теми же аргументами
+    print(f"Тем к генерации: {len(topics)} (пропущено из журнала ошибок: {len(skip)}), "
+          f"цель {args.target} вопросов, параллельно {args.concurrency}")
+    if not topics:
+        sys.exit(0)
+
+    progress = asyncio.run(run(topics, args))
+    elapsed = time.perf_counter() - progress.t0
+    print(f"Готово за {elapsed:.0f} с: +{progress.questions} вопросов, "
+          f"ошибок {progress.failed} (см. {args.failures})")
@@ -0,0 +1,89 @@
+# rest-api\src\lib\chat_pipeline.py
+import os
+import asyncio
+from typing import Any, Dict, Optional, Tuple
+from lib.rag import retrieve_async, answer_from_retrieved_async, remember_answer_async
+
+
+# Запускать генерацию ответа параллельно с модерацией, не дожидаясь вердикта.
+# Экономит время генерации для чистых сообщений ценой лишней нагрузки на LLM
+# для сообщений, которые потом будут заблокированы.
+SPECULATIVE_GENERATION = os.getenv("SPECULATIVE_GENERATION", "0") == "1"
+
+
+async def _cancel(task: Optional[asyncio.Task]) -> None:
+    """Отмена спекулятивной работы (поиск/генерация) для заблокированного сообщения"""
+    if task is None or task.done():
+        return
+    task.cancel()
+    try:
+        await task
+    except (asyncio.CancelledError, Exception):
+        pass
+
+
+async def _speculative_answer(question: str, collection, k: int, topic_id: Optional[int],
+                             scope: Optional[Dict] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    retrieved = await retrieve_async(question, collection, k=k, scope=scope)
+    # В кэш ответ попадает только после чистого вердикта модерации
+    rag = await answer_from_retrieved_async(question, retrieved, topic_id=topic_id,
+                                            remember=False)
+    return retrieved, rag
+
+
+async def moderate_and_retrieve(question: str, collection, detector, k=3,
+                                scope: Optional[Dict] = None) -> Dict[str, Any]:
+    """
+    Модерация и поиск контекста параллельно.
+    scope — область поиска темы (lib.topic_scope.topic_scope) или None.
+    Возвращает {"moderation": вердикт, "retrieved": найденное или None}.
+    """
+    retrieval = asyncio.create_task(retrieve_async(question, collection, k=k, scope=scope))
+    try:
+        verdict = await detector.check_async(question)
+    except BaseException:
+        await _cancel(retrieval)
+        raise
+
+    if verdict["has_swear"]:
+        await _cancel(retrieval)
+        return {"moderation": verdict, "retrieved": None}
+
+    return {"moderation": verdict, "retrieved": await retrieval}
+
+
+async def moderate_and_answer(question: str, collection, detector, k=3,
+                              topic_id: Optional[int] = None,
+                              scope: Optional[Dict] = None,
+                              speculative: bool = SPECULATIVE_GENERATION) -> Dict[str, Any]:
+    """
+    Полный чат-пайплайн: модерация идёт параллельно с поиском
+    (и, при speculative=True, с генерацией). Для чистого сообщения задержка
+    ≈ max(модерация, поиск) + генерация вместо суммы всех стадий.
+
+    Возвращает {"moderation": вердикт, "rag": результат get_rag_answer или None}.
+    """
+    if not speculative:
+        staged = await moderate_and_retrieve(question, collection, detector, k=k, scope=scope)
+        if staged["retrieved"] is None:
+            return {"moderation": staged["moderation"], "rag": None}
+        rag = await answer_from_retrieved_async(
+            question, staged["retrieved"], topic_id=topic_id)
+        return {"moderation": staged["moderation"], "rag": rag}
+
+    work = asyncio.create_task(
+        _speculative_answer(question, collection, k, topic_id, scope))
+    try:
+        verdict = await detector.check_async(question)
+    except BaseException:
+        await _cancel(work)
+        raise
+
+    if verdict["has_swear"]:
+        await _cancel(work)
+        return {"moderation": verdict, "rag": None}
+
+    retrieved, rag = await work
+    if rag["success"] and not rag["cached"]:
+        await remember_answer_async(retrieved, topic_id, rag["answer"], rag["gen_ms"])
+    return {"moderation": verdict, "rag": rag}
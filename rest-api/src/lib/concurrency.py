@@ -0,0 +1,52 @@
+# rest-api\src\lib\concurrency.py
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any
+
+
+# =========================
+# настройки
+# =========================
+
+# Потоки для CPU-тяжёлых эмбеддингов (отдельно от пула Starlette)
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "2"))
+
+# Сколько одновременных операций допускается на каждой стадии пайплайна
+STAGE_LIMITS: Dict[str, int] = {
+    "embed": int(os.getenv("EMBED_CONCURRENCY", str(EMBED_WORKERS))),
+    "retrieve": int(os.getenv("RETRIEVE_CONCURRENCY", "8")),
+    "moderation": int(os.getenv("MODERATION_CONCURRENCY", "4")),
+    "llm": int(os.getenv("LLM_CONCURRENCY", "2")),
+    "rerank": int(os.getenv("RERANK_CONCURRENCY", "1")),
+}
+
+embed_executor = ThreadPoolExecutor(
+    max_workers=EMBED_WORKERS, thread_name_prefix="embed")
+
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def stage_limit(stage: str) -> asyncio.Semaphore:
+    """
+    Семафор стадии пайплайна (embed, retrieve, moderation, llm, rerank).
+    Создаётся лениво, внутри работающего event loop.
+    """
+    sem = _semaphores.get(stage)
+    if sem is None:
+        sem = asyncio.Semaphore(STAGE_LIMITS.get(stage, 1))
+        _semaphores[stage] = sem
+    return sem
+
+
+async def run_embedding(fn: Callable, *args) -> Any:
+    """Запуск вычисления эмбеддингов в ограниченном пуле потоков"""
+    async with stage_limit("embed"):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(embed_executor, fn, *args)
+
+
+async def run_blocking(stage: str, fn: Callable, *args) -> Any:
+    """Запуск блокирующего вызова в потоке с лимитом стадии"""
+    async with stage_limit(stage):
+        return await asyncio.to_thread(fn, *args)
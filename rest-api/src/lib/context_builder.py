@@ -0,0 +1,170 @@
+# rest-api\src\lib\context_builder.py
+import os
+import re
+import threading
+from typing import Any, Dict, List, Tuple
+
+
+# Контекст, вопрос с инструкцией и num_predict должны поместиться в окно модели;
+# num_ctx чата по умолчанию считается из этого бюджета (lib/llm_client.py)
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1200"))
+# Токенизатора модели в API нет — оценка по символам (для русского текста ~3)
+CHARS_PER_TOKEN = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "3.0"))
+
+# build_index.py режет с chunk_overlap=200; с запасом на пробелы по краям
+MAX_OVERLAP = 300
+MIN_OVERLAP = 20
+# Абзацы короче этого не считаются повтором (заголовки, «Пример:»)
+MIN_DUPLICATE_LEN = 40
+
+SENTENCE_END_RE = re.compile(r"(?<!\d)[.!?…](?=\s)|\n")
+SPACES_RE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN) + 1 if text else 0
+
+
+def merge_overlap(left: str, right: str) -> str:
+    """Склейка соседних чанков: общий конец left / начало right берётся один раз"""
+    limit = min(len(left), len(right), MAX_OVERLAP)
+    for size in range(limit, MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + "\n" + right
+
+
+def _position(meta: Dict) -> int:
+    try:
+        return int(meta.get("chunk_id"))
+    except (TypeError, ValueError):
+        return -1
+
+
+def _passages(hits: List[Tuple[int, str, Dict]]) -> List[str]:
+    """Чанки одного документа по порядку в документе; соседние (i, i+1) склеиваются"""
+    hits = sorted(hits, key=lambda hit: (_position(hit[2]), hit[0]))
+    passages: List[str] = []
+    last = None
+    for _, text, meta in hits:
+        position = _position(meta)
+        if last is not None and position >= 0 and position == last:
+            continue  # тот же чанк дважды
+        if passages and last is not None and last >= 0 and position == last + 1:
+            passages[-1] = merge_overlap(passages[-1], text)
+        else:
+            passages.append(text)
+        last = position
+    return passages
+
+
+def _key(text: str) -> str:
+    return SPACES_RE.sub(" ", text).strip().lower()
+
+
+def _dedupe(passage: str, seen: set) -> str:
+    """Убирает абзацы, уже попавшие в контекст (общие блоки разных страниц документации)"""
+    kept = []
+    for paragraph in passage.split("\n"):
+        key = _key(paragraph)
+        if len(key) >= MIN_DUPLICATE_LEN:
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(paragraph)
+    return "\n".join(kept).strip()
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    """Обрезка по границе предложения не дальше max_chars"""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    ends = [m.end() for m in SENTENCE_END_RE.finditer(cut)]
+    if ends and ends[-1] > max_chars // 2:
+        cut = cut[:ends[-1]]
+    return cut.rstrip() + " …"
+
+
+class ContextStats:
+    """Сколько текста поиска доходит до промпта"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.chunks = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.truncated = 0
+
+    def record(self, chunks: int, tokens_in: int, tokens_out: int, truncated: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.chunks += chunks
+            self.tokens_in += tokens_in
+            self.tokens_out += tokens_out
+            self.truncated += truncated
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "max_tokens": CONTEXT_MAX_TOKENS,
+                "calls": self.calls,
+                "avg_chunks": self.chunks / self.calls if self.calls else 0.0,
+                "avg_tokens_in": round(self.tokens_in / self.calls, 1) if self.calls else 0.0,
+                "avg_tokens_out": round(self.tokens_out / self.calls, 1) if self.calls else 0.0,
+                "truncated": self.truncated
+            }
+
+
+context_stats = ContextStats()
+
+
+def build_context(retrieved: Dict[str, Any], max_tokens: int = CONTEXT_MAX_TOKENS) -> str:
+    """
+    Контекст для промпта из результата поиска.
+
+    Чанки группируются по документу (url), соседние по chunk_id склеиваются
+    без повтора перекрытия, повторяющиеся абзацы выбрасываются. Документы идут
+    в порядке релевантности лучшего чанка, фрагменты внутри — в порядке документа.
+    Текст обрезается по оценке в max_tokens токенов.
+    """
+    documents = retrieved.get("documents") or []
+    metadatas = retrieved.get("metadatas") or [{}] * len(documents)
+    if not documents:
+        return ""
+
+    groups: Dict[str, List[Tuple[int, str, Dict]]] = {}
+    titles: Dict[str, str] = {}
+    for rank, (text, meta) in enumerate(zip(documents, metadatas)):
+        meta = meta or {}
+        key = meta.get("url") or meta.get("title") or f"#{rank}"
+        groups.setdefault(key, []).append((rank, text.strip(), meta))
+        titles.setdefault(key, meta.get("title") or "")
+
+    budget = int(max_tokens * CHARS_PER_TOKEN)
+    seen: set = set()
+    blocks: List[str] = []
+    truncated = False
+    for key, hits in groups.items():  # dict хранит порядок первого (лучшего) чанка
+        passages = [p for p in (_dedupe(p, seen) for p in _passages(hits)) if p]
+        if not passages:
+            continue
+        header = f"[{titles[key]}]\n" if titles[key] else ""
+        body = "\n…\n".join(passages)
+        room = budget - len(header) - (2 if blocks else 0)
+        if len(body) > room:
+            truncated = True
+            if room < MIN_DUPLICATE_LEN * 2:
+                break
+            body = _truncate(body, room)
+        blocks.append(header + body)
+        budget -= len(blocks[-1]) + 2
+        if truncated:
+            break
+
+    context = "\n\n".join(blocks)
+    context_stats.record(
+        len(documents), estimate_tokens(" ".join(documents)),
+        estimate_tokens(context), truncated)
+    return context
@@ -1,36 +1,135 @@
 # rest-api\src\lib\creater_question.py
-import json
-from typing import List, Dict
+import os
+import math
+import random
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
+from typing import List, Dict, Optional, Tuple
 from langchain_classic.prompts import PromptTemplate
-from langchain_ollama import OllamaLLM  
 from langchain_community.embeddings import SentenceTransformerEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
 import re
 from num2words import num2words
+from lib.concurrency import STAGE_LIMITS, stage_limit
+from lib.llm_client import get_llm
+from lib.question_pool import OPTION_FIELDS, dedupe_questions, question_filter, validate_question
+from lib.structured_output import (acollect_valid, collect_valid, parse_objects,
+                                   structured_stats, with_format)
 
 # Инициализация LLM
-llm = OllamaLLM(model="mistral")
+llm = get_llm("questions")
 
-def generate_questions_from_book(num_questions: int, book_json: Dict) -> List[Dict]:
+# Map-reduce по разделам книги: в каждый промпт идёт один раздел не длиннее
+# QUESTIONS_SECTION_CHARS, поэтому размер промпта не зависит от размера книги
+SECTION_CHARS = int(os.getenv("QUESTIONS_SECTION_CHARS", "6000"))
+MIN_SECTION_CHARS = 300
+QUESTIONS_PER_SECTION = int(os.getenv("QUESTIONS_PER_SECTION", "2"))
+# coverage — разделы равномерно по книге, random — случайные
+SECTION_SELECTION = os.getenv("QUESTIONS_SECTION_SELECTION", "coverage")
+# Запас на невалидные и повторяющиеся вопросы
+OVERGENERATION = 1.25
+# Сколько раз догенерировать недостающие вопросы раздела (оборванный или неполный ответ)
+QUESTIONS_JSON_RETRIES = int(os.getenv("QUESTIONS_JSON_RETRIES", "1"))
+
+# Схема ответа для format Ollama: модель не может выйти за пределы этого JSON
+QUESTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question_text": {"type": "string"},
+                    **{field: {"type": "string"} for field in OPTION_FIELDS},
+                    "correct_answer": {"type": "string", "enum": ["A", "B", "C", "D"]}
+                },
+                "required": ["question_text", *OPTION_FIELDS, "correct_answer"]
+            }
+        }
+    },
+    "required": ["questions"]
+}
+
+PAGE_MARKER_RE = re.compile(r'--- Страница \d+.*?---', re.DOTALL)
+
+
+def _windows(text: str) -> List[str]:
+    """Текст раздела кусками не длиннее SECTION_CHARS, по границе абзаца"""
+    parts = []
+    while len(text) > SECTION_CHARS:
+        cut = text.rfind("\n", SECTION_CHARS // 2, SECTION_CHARS)
+        cut = cut if cut > 0 else SECTION_CHARS
+        parts.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if len(text) >= MIN_SECTION_CHARS or not parts:
+        parts.append(text)
+    return parts
+
+
+def book_sections(book_json: Dict) -> List[Tuple[str, str]]:
     """
-    Генерирует вопросы из книги в формате для записи в БД.
+    Разделы книги в порядке чтения: (путь заголовков, текст без маркеров страниц).
+    Длинные главы делятся на части; темы документации без глав — весь текст темы.
     """
+    sections: List[Tuple[str, str]] = []
 
-    # Собираем весь текст книги
-    all_content = []
-    num_text = num2words(num_questions, lang='ru')
+    def walk(nodes, path):
+        for node in nodes:
+            node_path = path + [node["name"]] if node.get("name") else path
+            text = PAGE_MARKER_RE.sub('', node.get("content") or "").strip()
+            if len(text) >= MIN_SECTION_CHARS:
+                sections.extend((" / ".join(node_path), part) for part in _windows(text))
+            walk(node.get("chapters") or [], node_path)
+
+    walk(book_json.get("chapters") or [], [])
+    if not sections:
+        text = (book_json.get("clean_content") or book_json.get("content") or "").strip()
+        if text:
+            sections = [(book_json.get("title", ""), part) for part in _windows(text)]
+    return sections
 
-    for chapter in book_json.get("chapters", []):
-        for subchapter in chapter.get("chapters", []):
-            content = subchapter.get("content", "")
-            clean_content = re.sub(
-                r'--- Страница \d+.*?---', '', content, flags=re.DOTALL)
-            if clean_content.strip():
-                all_content.append(clean_content[:3000])
 
-    context = "\n".join(all_content)
+def select_sections(sections: List[Tuple[str, str]], count: int,
+                    strategy: str = SECTION_SELECTION, rng: Optional[random.Random] = None):
+    """count разделов: равномерно по книге со случайным сдвигом (coverage) или случайно"""
+    rng = rng or random.Random()
+    if count >= len(sections):
+        return list(sections)
+    if strategy == "random":
+        indexes = sorted(rng.sample(range(len(sections)), count))
+    else:
+        stride = len(sections) / count
+        indexes = [int((i + rng.random()) * stride) for i in range(count)]
+    return [sections[i] for i in indexes]
+
+
+def plan_sections(num_questions: int, book_json: Dict) -> List[Tuple[str, str, int]]:
+    """Задания map-шага: (заголовок раздела, текст, сколько вопросов по нему)"""
+    sections = book_sections(book_json)
+    if not sections or num_questions <= 0:
+        return []
+    wanted = math.ceil(num_questions * OVERGENERATION)
+    count = min(len(sections), math.ceil(wanted / QUESTIONS_PER_SECTION))
+    per_section = math.ceil(wanted / count)
+    return [(title, text, per_section) for title, text in select_sections(sections, count)]
+
+
+def merge_questions(batches: List[List[Dict]], num_questions: int) -> List[Dict]:
+    """Reduce-шаг: по очереди из каждого раздела, без невалидных и повторов"""
+    interleaved = [q for group in zip_longest(*batches) for q in group if q is not None]
+    return dedupe_questions(interleaved)[:num_questions]
+
+
+def build_questions_chain(num_questions: int, topic: str, section: str, context: str):
+    """
+    Собирает цепочку генерации вопросов по одному разделу книги.
+    Возвращает (цепочка, аргумент для invoke).
+    """
+    num_text = num2words(num_questions, lang='ru')
 
     # Усиленный промпт с требованием строгого формата
     prompt_template = PromptTemplate(
@@ -38,6 +137,7 @@ def generate_questions_from_book(num_questions: int, book_json: Dict) -> List[Di
 
 На основе следующего текста сгенерируй {num_text} не больше не меньше именно {num_text} тестовых вопросов на РУССКОМ ЯЗЫКЕ.
 Тема книги: {topic}
+Раздел: {section}
 
 Требования:
 1. Все вопросы и варианты ответов должны быть на РУССКОМ ЯЗЫКЕ
@@ -49,76 +149,124 @@ def generate_questions_from_book(num_questions: int, book_json: Dict) -> List[Di
 {context}
 
 ТЫ ДОЛЖЕН ВЕРНУТЬ ТОЛЬКО JSON В СЛЕДУЮЩЕМ ФОРМАТЕ:
-[
-  {{
-    "question_text": "текст вопроса на русском",
-    "option_a": "вариант A на русском",
-    "option_b": "вариант B на русском", 
-    "option_c": "вариант C на русском",
-    "option_d": "вариант D на русском",
-    "correct_answer": "A"
-  }},
-  ... еще вопросы ...
-]
+{{
+  "questions": [
+    {{
+      "question_text": "текст вопроса на русском",
+      "option_a": "вариант A на русском",
+      "option_b": "вариант B на русском",
+      "option_c": "вариант C на русском",
+      "option_d": "вариант D на русском",
+      "correct_answer": "A"
+    }},
+    ... еще вопросы ...
+  ]
+}}
 
 НЕ ДОБАВЛЯЙ НИКАКИХ ДОПОЛНИТЕЛЬНЫХ ТЕКСТОВ, КОММЕНТАРИЕВ ИЛИ РАЗМЕТКИ.""",
-        input_variables=["num_text", "topic", "context"]
+        input_variables=["num_text", "topic", "section", "context"]
     )
 
     qa_chain = (
         {
             "num_text": RunnablePassthrough(),
-            "topic": lambda _: book_json.get("title", ""),
+            "topic": lambda _: topic,
+            "section": lambda _: section,
             "context": lambda _: context
         }
         | prompt_template
-        | llm
+        | with_format(llm, QUESTIONS_SCHEMA)
         | StrOutputParser()
     )
 
-    # Генерируем вопросы
-    response = qa_chain.invoke(num_text)
-
-    # Усиленная очистка ответа
-    try:
-        # Удаляем все не-JSON части
-        response = response.strip()
-
-        # Ищем JSON массив
-        json_match = re.search(r'\[\s*\{.*\}\s*\]', response, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(0)
-        else:
-            # Если не нашли полный массив, ищем любые объекты
-            json_match = re.findall(r'\{[^{}]*\}', response)
-            if json_match:
-                json_str = f"[{','.join(json_match)}]"
-            else:
-                return []
-
-        # Парсим JSON
-        questions = json.loads(json_str)
-
-        # Проверяем и чистим каждый вопрос
-        cleaned_questions = []
-        for q in questions[:num_questions]:
-            # Убеждаемся, что все поля строковые и на русском
-            cleaned_q = {
-                "question_text": str(q.get("question_text", "")).strip(),
-                "option_a": str(q.get("option_a", "")).strip(),
-                "option_b": str(q.get("option_b", "")).strip(),
-                "option_c": str(q.get("option_c", "")).strip(),
-                "option_d": str(q.get("option_d", "")).strip(),
-                "correct_answer": str(q.get("correct_answer", "A")).strip().upper()
-            }
+    return qa_chain, num_text
 
-            # Проверяем, что есть текст вопроса и варианты
-            if cleaned_q["question_text"] and cleaned_q["option_a"]:
-                cleaned_questions.append(cleaned_q)
 
-        return cleaned_questions
+def parse_questions(response: str, num_questions: int) -> List[Dict]:
+    """
+    Разбирает готовый ответ модели в список вопросов для записи в БД.
+    Законченные вопросы из оборванного ответа сохраняются.
+    """
+    questions = [q for q in map(validate_question, parse_objects(response)) if q is not None]
+    return questions[:num_questions]
+
+
+def _section_questions(topic: str, section: Tuple[str, str, int]) -> List[Dict]:
+    """
+    Вопросы по разделу: ответ разбирается потоком, поток закрывается, как только
+    набралось нужное число. Если вопросов не хватило — догенерируются только недостающие.
+    """
+    title, text, count = section
+    accept = question_filter()
+    questions: List[Dict] = []
+    for attempt in range(QUESTIONS_JSON_RETRIES + 1):
+        missing = count - len(questions)
+        if missing <= 0:
+            break
+        if attempt:
+            structured_stats.retry()
+        qa_chain, num_text = build_questions_chain(missing, topic, title, text)
+        questions += collect_valid(qa_chain.stream(num_text), accept, missing)
+    return questions
+
+
+async def _section_questions_async(topic: str, section: Tuple[str, str, int]) -> List[Dict]:
+    title, text, count = section
+    accept = question_filter()
+    questions: List[Dict] = []
+    for attempt in range(QUESTIONS_JSON_RETRIES + 1):
+        missing = count - len(questions)
+        if missing <= 0:
+            break
+        if attempt:
+            structured_stats.retry()
+        qa_chain, num_text = build_questions_chain(missing, topic, title, text)
+        async with stage_limit("llm"):
+            questions += await acollect_valid(qa_chain.astream(num_text), accept, missing)
+    return questions
+
+
+def _collect(results: List, num_questions: int) -> List[Dict]:
+    """Вопросы успешных разделов; если упали все — исключение первого"""
+    batches = [r for r in results if not isinstance(r, BaseException)]
+    errors = [r for r in results if isinstance(r, BaseException)]
+    for e in errors:
+        print(f"⚠️ Раздел пропущен: {str(e)[:100]}")
+    if errors and not batches:
+        raise errors[0]
+    return merge_questions(batches, num_questions)
+
 
-    except (json.JSONDecodeError, KeyError) as e:
-        print(f"Ошибка парсинга JSON: {e}")
-        print(f"Ответ модели: {response[:500]}")
+def generate_questions_from_book(num_questions: int, book_json: Dict) -> List[Dict]:
+    """
+    Генерирует вопросы из книги в формате для записи в БД:
+    параллельно по выбранным разделам (map), затем слияние и дедупликация (reduce).
+    """
+    plan = plan_sections(num_questions, book_json)
+    if not plan:
+        return []
+    topic = book_json.get("title", "")
+
+    def run(section):
+        try:
+            return _section_questions(topic, section)
+        except Exception as e:
+            return e
+
+    workers = max(1, min(len(plan), STAGE_LIMITS["llm"]))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run, plan))
+    return _collect(results, num_questions)
+
+
+async def generate_questions_from_book_async(num_questions: int, book_json: Dict) -> List[Dict]:
+    """
+    Асинхронный вариант generate_questions_from_book (не занимает поток воркера).
+    """
+    plan = plan_sections(num_questions, book_json)
+    if not plan:
         return []
+    topic = book_json.get("title", "")
+    results = await asyncio.gather(
+        *(_section_questions_async(topic, section) for section in plan), return_exceptions=True)
+    return _collect(results, num_questions)
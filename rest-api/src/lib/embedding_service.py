@@ -0,0 +1,111 @@
+# rest-api\src\lib\embedding_service.py
+import asyncio
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set
+from lib.concurrency import run_embedding
+
+
+def normalize_query(text: str) -> str:
+    """Нормализация текста запроса: NFC и схлопывание пробелов"""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+class EmbeddingBatcher:
+    """
+    Микробатчинг эмбеддингов запросов внутри процесса API.
+
+    Запросы, пришедшие в течение window_ms, объединяются в один батч
+    (не больше max_batch) и считаются одним forward-проходом модели
+    в пуле эмбеддингов. Готовые векторы кэшируются (LRU по тексту запроса),
+    одинаковые запросы внутри окна считаются один раз.
+    """
+
+    def __init__(self, embed_many: Callable[[List[str]], List[List[float]]],
+                 max_batch: int = 16, window_ms: float = 5.0, cache_size: int = 2048):
+        self.embed_many = embed_many
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.cache_size = cache_size
+
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._queue: List[str] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Ссылки на запущенные батчи: иначе задачу может собрать GC, не разбудив ожидающих
+        self._batches: Set[asyncio.Task] = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.embedded = 0
+
+    async def embed(self, text: str) -> List[float]:
+        key = normalize_query(text)
+
+        vector = self._cache.get(key)
+        if vector is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return vector
+        self.misses += 1
+
+        # Такой же запрос уже ждёт батча — ждём его результат
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = future
+            self._queue.append(key)
+
+            if len(self._queue) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._flush)
+
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._queue:
+            return
+        batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+        task = asyncio.ensure_future(self._run_batch(batch))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+        if self._queue:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+
+    async def _run_batch(self, batch: List[str]) -> None:
+        try:
+            vectors = await run_embedding(self.embed_many, batch)
+        except Exception as e:
+            for key in batch:
+                future = self._pending.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.embedded += len(batch)
+        for key, vector in zip(batch, vectors):
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            future = self._pending.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(vector)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "cache_size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "batches": self.batches,
+            "avg_batch_size": self.embedded / self.batches if self.batches else 0.0
+        }
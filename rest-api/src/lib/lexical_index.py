@@ -0,0 +1,162 @@
+# rest-api\src\lib\lexical_index.py
+import os
+import re
+import json
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+from lib.topic_search import normalize_text, stem
+
+
+LEXICAL_INDEX_NAME = 'lexical_index.sqlite'
+
+# Частые слова вопросов: в OR-запросе они совпадают почти со всеми чанками
+STOPWORDS = {
+    "и", "в", "во", "на", "с", "со", "к", "по", "о", "об", "от", "до", "за", "из",
+    "для", "при", "не", "ли", "или", "а", "но", "что", "как", "какой", "какая",
+    "какие", "каким", "где", "когда", "зачем", "почему", "это", "этот", "эта",
+    "мне", "я", "ты", "вы", "мы", "он", "она", "они", "есть", "можно", "нужно",
+    "the", "a", "an", "of", "to", "in", "on", "for", "and", "or", "is", "how", "what",
+}
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Флаги CLI, имена ресурсов и коды ошибок: kubectl-get, --max-pods, s3.amazonaws
+COMPOUND_RE = re.compile(r"\w+(?:[-_./:]+\w+)+", re.UNICODE)
+
+
+def lexical_query(question: str) -> str:
+    """
+    MATCH-строка FTS5 для вопроса: слова (основы — префиксом) через OR,
+    плюс составные токены вроде --max-pods как фразы — точные совпадения
+    получают дополнительный вес в bm25.
+    """
+    text = normalize_text(question)
+    terms = []
+    for compound in COMPOUND_RE.findall(text):
+        parts = WORD_RE.findall(compound)
+        terms.append('"' + " ".join(parts) + '"')
+    seen = set()
+    for word in WORD_RE.findall(text):
+        if word in STOPWORDS or len(word) < 2:
+            continue
+        word = stem(word)
+        if word not in seen:
+            seen.add(word)
+            terms.append(f'"{word}"*')
+    return " OR ".join(terms)
+
+
+class LexicalIndex:
+    """
+    BM25-индекс (SQLite FTS5) по тем же чанкам, что и коллекция cloud_docs.
+
+    Текст чанков хранится в таблице chunks (chunk_id — id чанка в Chroma),
+    FTS5-таблица chunks_fts индексирует её как external content и
+    поддерживается триггерами.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY,
+                chunk_id TEXT NOT NULL UNIQUE,
+                title TEXT,
+                content TEXT
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                title, content,
+                content = 'chunks', content_rowid = 'id',
+                tokenize = 'unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts (rowid, title, content)
+                VALUES (new.id, new.title, new.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, title, content)
+                VALUES ('delete', old.id, old.title, old.content);
+            END;
+        """)
+        self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM chunks").fetchone()[0]
+
+    def upsert(self, items: Iterable[Tuple[str, str, dict]]) -> None:
+        """items: (id чанка, текст, метаданные) — как в build_index"""
+        rows = [
+            (chunk_id, normalize_text((meta or {}).get("title", ""), lower=False),
+             normalize_text(text, lower=False))
+            for chunk_id, text, meta in items
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE chunk_id = ?", [(r[0],) for r in rows])
+            self._conn.executemany(
+                "INSERT INTO chunks (chunk_id, title, content) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def delete(self, chunk_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE chunk_id = ?", [(cid,) for cid in chunk_ids])
+            self._conn.commit()
+
+    def search(self, question: str, k: int = 10,
+               chunk_ids: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """[(id чанка, bm25)] — чем меньше bm25, тем лучше; chunk_ids ограничивает поиск"""
+        match = lexical_query(question)
+        if not match:
+            return []
+        scope_sql, params = "", [match]
+        if chunk_ids is not None:
+            scope_sql = "AND c.chunk_id IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(list(chunk_ids)))
+        with self._lock:
+            try:
+                return self._conn.execute(f"""
+                    SELECT c.chunk_id, bm25(chunks_fts, 2.0, 1.0) AS rank
+                    FROM chunks_fts
+                    JOIN chunks c ON c.id = chunks_fts.rowid
+                    WHERE chunks_fts MATCH ? {scope_sql}
+                    ORDER BY rank
+                    LIMIT ?
+                """, (*params, k)).fetchall()
+            except sqlite3.OperationalError as e:
+                print(f"  Lexical search failed: {str(e)[:100]}")
+                return []
+
+    def sync_from_collection(self, collection, batch_size: int = 1000) -> None:
+        """Заполняет пустой индекс чанками из Chroma (базы, собранные до появления индекса)"""
+        if self.count():
+            return
+        offset = 0
+        while True:
+            res = collection.get(include=["documents", "metadatas"],
+                                 limit=batch_size, offset=offset)
+            ids = res.get("ids") or []
+            if not ids:
+                break
+            self.upsert(zip(ids, res["documents"], res["metadatas"]))
+            offset += len(ids)
+        print(f"🔎 Lexical index: {offset} chunks loaded from Chroma")
+
+
+@lru_cache(maxsize=1)
+def get_lexical_index() -> Optional[LexicalIndex]:
+    """Общий индекс процесса; None, если гибридный поиск отключён (HYBRID_RETRIEVAL=0)"""
+    if os.getenv("HYBRID_RETRIEVAL", "1") == "0":
+        return None
+    default_path = os.path.join(os.environ.get('CHROMA_DIR', './db'), LEXICAL_INDEX_NAME)
+    path = os.getenv("LEXICAL_INDEX_PATH", default_path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return LexicalIndex(path)
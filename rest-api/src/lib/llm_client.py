@@ -0,0 +1,129 @@
+# rest-api\src\lib\llm_client.py
+import os
+import math
+from functools import lru_cache
+from typing import Any, Dict, Optional
+from langchain_ollama import OllamaLLM
+
+
+# OLLAMA_URL и OLLAMA_CHAT_MODEL задаёт docker-compose; прежние имена — запасные
+OLLAMA_BASE_URL = os.getenv("OLLAMA_URL") or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+CHAT_MODEL = os.getenv("OLLAMA_CHAT_MODEL") or os.getenv("CHAT_MODEL", "mistral")
+# Сколько модель остаётся в памяти после запроса; -1 — не выгружать
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+# Статический префикс, шаблон промпта и вопрос сверх контекста поиска, токены
+CHAT_PROMPT_OVERHEAD = 768
+CHAT_NUM_PREDICT = _env_int("CHAT_NUM_PREDICT", 512)
+
+
+def _chat_num_ctx() -> int:
+    """
+    Окно чата из бюджетов: контекст поиска + промпт + ответ, вверх до кратного 1024.
+    Если окно меньше, Ollama обрезает промпт с начала и теряет кэш статического префикса.
+    """
+    from lib.context_builder import CONTEXT_MAX_TOKENS
+    needed = CONTEXT_MAX_TOKENS + CHAT_PROMPT_OVERHEAD + CHAT_NUM_PREDICT
+    return math.ceil(needed / 1024) * 1024
+
+
+# Параметры генерации по эндпоинтам. num_ctx — размер KV-кэша: больше окно —
+# больше памяти и дольше префилл, поэтому каждому сценарию — своё.
+GENERATION_PROFILES: Dict[str, Dict[str, Any]] = {
+    "chat": {
+        "model": CHAT_MODEL,
+        "num_ctx": _env_int("CHAT_NUM_CTX", _chat_num_ctx()),
+        "num_predict": CHAT_NUM_PREDICT,
+        "temperature": 0.1,
+        "top_p": 0.95,
+    },
+    "questions": {
+        "model": os.getenv("QUESTIONS_MODEL", CHAT_MODEL),
+        "num_ctx": _env_int("QUESTIONS_NUM_CTX", 4096),
+        "num_predict": _env_int("QUESTIONS_NUM_PREDICT", 1024),
+    },
+    "moderation": {
+        "model": os.getenv("MODERATION_MODEL", CHAT_MODEL),
+        "num_ctx": _env_int("MODERATION_NUM_CTX", 1024),
+        "num_predict": _env_int("MODERATION_NUM_PREDICT", 64),
+        "temperature": 0.0,
+    },
+}
+
+
+# Неизменная часть промпта чата. Стоит в самом начале и не зависит от запроса,
+# поэтому Ollama переиспользует её KV-кэш и не префиллит заново на каждом вопросе.
+CHAT_SYSTEM_PREFIX = """Ты — AI-репетитор по техническим дисциплинам. Отвечай подробно, шаг за шагом.
+Используй ТОЛЬКО информацию из блока "Контекст". Ответ должен содержать все ключевые шаги.
+Если информации недостаточно — честно скажи.
+
+---
+"""
+
+
+@lru_cache(maxsize=None)
+def get_llm(profile: str, model: Optional[str] = None) -> OllamaLLM:
+    """Клиент Ollama для профиля (модель можно переопределить); один на процесс"""
+    options = dict(GENERATION_PROFILES[profile])
+    options["model"] = model or options["model"]
+    return OllamaLLM(base_url=OLLAMA_BASE_URL, keep_alive=OLLAMA_KEEP_ALIVE, **options)
+
+
+def _ollama_options(profile: str, **overrides) -> Dict[str, Any]:
+    options = {key: value for key, value in GENERATION_PROFILES[profile].items() if key != "model"}
+    options.update(overrides)
+    return options
+
+
+async def warm_up(profile: str = "chat", prefix: str = CHAT_SYSTEM_PREFIX) -> None:
+    """
+    Загрузка модели профиля с keep_alive и префилл статического префикса,
+    чтобы первый запрос пользователя не ждал загрузку и общий префикс.
+    """
+    import ollama
+    client = ollama.AsyncClient(host=OLLAMA_BASE_URL)
+    try:
+        await client.generate(
+            model=GENERATION_PROFILES[profile]["model"],
+            prompt=prefix,
+            options=_ollama_options(profile, num_predict=1),
+            keep_alive=OLLAMA_KEEP_ALIVE,
+        )
+        print(f"🔥 LLM profile '{profile}' warmed up")
+    except Exception as e:
+        print(f"⚠️ LLM warm-up failed: {str(e)[:100]}")
+
+
+def generate_with_stats(prompt: str, profile: str = "chat",
+                        keep_alive: Optional[str] = OLLAMA_KEEP_ALIVE) -> Dict[str, Any]:
+    """
+    Генерация без стриминга с замерами Ollama: загрузка модели, префилл
+    (prompt_eval) и декодирование (eval), мс и токены.
+    """
+    import ollama
+    client = ollama.Client(host=OLLAMA_BASE_URL)
+    response = client.generate(
+        model=GENERATION_PROFILES[profile]["model"],
+        prompt=prompt,
+        options=_ollama_options(profile),
+        keep_alive=keep_alive,
+    )
+    ns = 1e6
+    prefill_tokens = response.get("prompt_eval_count") or 0
+    decode_tokens = response.get("eval_count") or 0
+    decode_ms = (response.get("eval_duration") or 0) / ns
+    return {
+        "answer": response.get("response", ""),
+        "load_ms": (response.get("load_duration") or 0) / ns,
+        "prefill_ms": (response.get("prompt_eval_duration") or 0) / ns,
+        "prefill_tokens": prefill_tokens,
+        "decode_ms": decode_ms,
+        "decode_tokens": decode_tokens,
+        "decode_tps": decode_tokens / (decode_ms / 1000) if decode_ms else 0.0,
+        "total_ms": (response.get("total_duration") or 0) / ns,
+    }
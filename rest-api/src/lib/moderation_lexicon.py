@@ -0,0 +1,270 @@
+# rest-api\src\lib\moderation_lexicon.py
+import re
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+
+# =========================
+# словарь
+# =========================
+
+# Однозначный мат и оскорбления: решение принимается без LLM
+STRONG_STEMS = [
+    "хуй", "хуе", "хуя", "хую", "хуи",
+    "пизд", "пизж",
+    "еба", "ебл", "ебу", "ебн", "ебе", "еби", "ебь", "ебы",
+    "бляд", "блят",
+    "мудак", "мудил", "мудач", "мудоз",
+    "пидор", "пидар", "пидр",
+    "залуп", "шлюх", "гандон", "гондон", "дроч",
+    "ублюд", "мраз", "сволоч", "долбоеб",
+]
+
+# Слова, допускающие безобидное прочтение ("сук", "хрен", "тупой угол"):
+# такие сообщения считаются неоднозначными и уходят в LLM
+WEAK_STEMS = [
+    "сук", "суч", "хер", "хрен", "жоп", "говн", "дерьм", "срак", "ссан",
+    "бля", "дурак", "дура", "идиот", "дебил", "тупиц", "тупой", "урод",
+    "кретин", "придур", "твар", "козел", "козл", "даун", "чмо", "лох",
+    "манда", "педик",
+]
+
+# Корни, которые засчитываются только как отдельное слово
+WHOLE_WORD_STEMS = {"бля", "чмо", "лох", "манда", "дура", "даун"}
+
+# Приставки, после которых корень всё ещё считается началом слова
+# ("нахуй", "заебал", "отъебись"); прочие префиксы ("употребля", "хребет") — нет
+ALLOWED_PREFIXES = {
+    "", "на", "за", "по", "от", "отъ", "оть", "вы", "до", "про", "у", "раз",
+    "рас", "при", "пере", "под", "подъ", "подь", "въ", "съ", "из",
+    "изъ", "недо", "долбо", "о", "об", "объ", "обь", "в", "ни", "не", "а",
+}
+
+# Короткий сильный корень после однобуквенной приставки слишком часто
+# оказывается обычным словом ("вебинар", "в вебе"): решение оставляем LLM
+SHORT_STEM_LEN = 3
+
+# Гомоглифы и leetspeak внутри кириллических слов
+HOMOGLYPHS = str.maketrans({
+    "a": "а", "b": "б", "c": "с", "e": "е", "k": "к", "m": "м", "h": "н",
+    "o": "о", "p": "р", "t": "т", "x": "х", "y": "у", "u": "и", "i": "и",
+    "n": "п", "r": "г",
+    "3": "з", "0": "о", "6": "б", "4": "ч", "9": "я", "@": "а",
+    "ё": "е",
+})
+
+CYRILLIC = re.compile(r"[а-яё]")
+WORD = re.compile(r"[\w@*#]+(?:[.\-_][\w@*#]+)*")
+MASK = re.compile(r"[*#]")
+REPEATS = re.compile(r"(.)\1{2,}")
+
+
+def normalize_word(word: str) -> str:
+    """
+    Нормализация одного слова: регистр, разделители внутри слова,
+    гомоглифы/leetspeak (только для слов с кириллицей), повторы букв.
+    """
+    word = word.lower().replace("ё", "е")
+    word = re.sub(r"[.\-_]", "", word)
+    # Чисто латинские слова не трогаем: "ebay" не должен стать "ебау"
+    if CYRILLIC.search(word):
+        word = word.translate(HOMOGLYPHS)
+    return REPEATS.sub(r"\1", word)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Нормализованные слова сообщения. Подряд идущие однобуквенные токены
+    склеиваются ("х у й" → "хуй").
+    """
+    words = []
+    singles = []
+    for raw in WORD.findall(text or ""):
+        if len(raw) == 1:
+            singles.append(raw)
+            continue
+        if len(singles) > 1:
+            words.append(normalize_word("".join(singles)))
+        elif singles:
+            words.append(normalize_word(singles[0]))
+        singles = []
+        words.append(normalize_word(raw))
+    if len(singles) > 1:
+        words.append(normalize_word("".join(singles)))
+    elif singles:
+        words.append(normalize_word(singles[0]))
+    return words
+
+
+# =========================
+# Aho-Corasick
+# =========================
+
+class AhoCorasick:
+    """Автомат Ахо-Корасик: все вхождения набора корней за один проход"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[str]] = [[]]
+
+        for pattern in patterns:
+            self._add(pattern)
+        self._build()
+
+    def _add(self, pattern: str) -> None:
+        state = 0
+        for ch in pattern:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            state = nxt
+        self.out[state].append(pattern)
+
+    def _build(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Пары (позиция начала, корень)"""
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for pattern in self.out[state]:
+                yield i - len(pattern) + 1, pattern
+
+
+# =========================
+# n-граммный скорер
+# =========================
+
+def _bigrams(s: str) -> Set[str]:
+    return {s[i:i + 2] for i in range(len(s) - 1)}
+
+
+def _edit_distance(a: str, b: str) -> int:
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1,
+                           prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+class NgramScorer:
+    """
+    Нечёткое сходство начала слова с корнями словаря.
+    Кандидаты отбираются по инвертированному индексу биграмм,
+    оценка — 1 - расстояние Левенштейна / длина корня.
+    """
+
+    def __init__(self, stems: Iterable[str], min_len: int = 4):
+        self.index: Dict[str, Set[str]] = {}
+        for stem in stems:
+            if len(stem) < min_len:
+                continue
+            for bg in _bigrams(stem):
+                self.index.setdefault(bg, set()).add(stem)
+
+    def score(self, word: str) -> Tuple[float, str]:
+        candidates: Set[str] = set()
+        for bg in _bigrams(word[:8]):
+            candidates |= self.index.get(bg, set())
+
+        best, best_stem = 0.0, ""
+        for stem in candidates:
+            head = word[:len(stem)]
+            if len(head) < len(stem):
+                continue
+            sim = 1.0 - _edit_distance(head, stem) / len(stem)
+            if sim > best:
+                best, best_stem = sim, stem
+        return best, best_stem
+
+
+# =========================
+# классификатор
+# =========================
+
+class ObsceneLexicon:
+    """
+    Быстрый локальный уровень модерации между regex и LLM.
+
+    classify() возвращает verdict:
+      "swear"     — найден однозначный корень;
+      "ambiguous" — слабый корень, короткий сильный после однобуквенной приставки,
+                    маскировка (*, #) или нечёткое сходство;
+      "clean"     — ничего подозрительного, LLM не нужен.
+    """
+
+    def __init__(self, strong: Iterable[str] = STRONG_STEMS,
+                 weak: Iterable[str] = WEAK_STEMS,
+                 use_ngrams: bool = True,
+                 ngram_threshold: float = 0.75):
+        self.strong = set(strong)
+        self.weak = set(weak)
+        self.automaton = AhoCorasick(self.strong | self.weak)
+        self.scorer = NgramScorer(self.strong) if use_ngrams else None
+        self.ngram_threshold = ngram_threshold
+
+    def _stem_allowed(self, word: str, start: int, stem: str) -> bool:
+        if stem in WHOLE_WORD_STEMS:
+            return start == 0 and len(word) == len(stem)
+        return word[:start] in ALLOWED_PREFIXES
+
+    def _stem_kind(self, word: str, start: int, stem: str) -> str:
+        if stem not in self.strong:
+            return "weak"
+        if start == 1 and len(stem) <= SHORT_STEM_LEN:
+            return "weak"
+        return "strong"
+
+    def classify(self, text: str) -> Dict:
+        strong_words: List[str] = []
+        weak_words: List[str] = []
+        score = 0.0
+
+        for word in tokenize(text):
+            hit = None
+            for start, stem in self.automaton.iter_matches(word):
+                if not self._stem_allowed(word, start, stem):
+                    continue
+                hit = self._stem_kind(word, start, stem)
+                if hit == "strong":
+                    break
+
+            if hit == "strong":
+                strong_words.append(word)
+                continue
+            if hit == "weak" or (MASK.search(word) and len(word) >= 3):
+                weak_words.append(word)
+                continue
+
+            if self.scorer is not None and len(word) >= 4:
+                word_score, _ = self.scorer.score(word)
+                if word_score > score:
+                    score = word_score
+                if word_score >= self.ngram_threshold:
+                    weak_words.append(word)
+
+        if strong_words:
+            return {"verdict": "swear", "found_words": strong_words, "score": 1.0}
+        if weak_words:
+            return {"verdict": "ambiguous", "found_words": weak_words, "score": score}
+        return {"verdict": "clean", "found_words": [], "score": score}
@@ -0,0 +1,249 @@
+# rest-api\src\lib\question_pool.py
+import os
+import re
+import json
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+import crud
+from models import Question, QuestionJob, Topic
+
+
+# Сколько вопросов держать в каждой теме заранее (тест берёт 4)
+QUESTION_POOL_MIN = int(os.getenv("QUESTION_POOL_MIN", "12"))
+# Сколько вопросов просить у модели за одну генерацию
+QUESTION_POOL_BATCH = int(os.getenv("QUESTION_POOL_BATCH", "4"))
+QUESTION_JOB_MAX_ATTEMPTS = int(os.getenv("QUESTION_JOB_MAX_ATTEMPTS", "3"))
+# Задача в статусе running дольше аренды считается брошенной (воркер упал)
+QUESTION_JOB_LEASE = timedelta(seconds=int(os.getenv("QUESTION_JOB_LEASE_SECONDS", "900")))
+# Тема с проваленной задачей не ставится в очередь повторно это время
+QUESTION_JOB_RETRY_AFTER = timedelta(seconds=int(os.getenv("QUESTION_JOB_RETRY_AFTER_SECONDS", "3600")))
+
+OPTION_FIELDS = ("option_a", "option_b", "option_c", "option_d")
+SPACES_RE = re.compile(r"\s+")
+PUNCT_RE = re.compile(r"[^\w\s]", re.UNICODE)
+
+
+# =========================
+# validation
+# =========================
+
+def question_key(question_text: str) -> str:
+    """Ключ дедупликации: без регистра, пунктуации и лишних пробелов"""
+    value = PUNCT_RE.sub(" ", (question_text or "").lower().replace("ё", "е"))
+    return SPACES_RE.sub(" ", value).strip()
+
+
+def validate_question(q: Dict) -> Optional[Dict]:
+    """Вопрос в формате таблицы questions или None, если он неполный"""
+    if not isinstance(q, dict):
+        return None
+    question = {
+        "question_text": str(q.get("question_text", "")).strip(),
+        **{field: str(q.get(field, "")).strip()[:255] for field in OPTION_FIELDS},
+        "correct_answer": str(q.get("correct_answer", "")).strip().upper()[:1],
+    }
+    if not question["question_text"] or not all(question[f] for f in OPTION_FIELDS):
+        return None
+    if question["correct_answer"] not in ("A", "B", "C", "D"):
+        return None
+    if len({question_key(question[f]) for f in OPTION_FIELDS}) < len(OPTION_FIELDS):
+        return None  # одинаковые варианты ответа
+    return question
+
+
+def question_filter(existing: Iterable[str] = ()) -> Callable[[Dict], Optional[Dict]]:
+    """
+    Проверка вопросов по одному (для потокового разбора): вопрос после
+    validate_question или None, если он неполный или уже встречался.
+    """
+    seen = {question_key(t) for t in existing}
+
+    def accept(q: Dict) -> Optional[Dict]:
+        q = validate_question(q)
+        if q is None:
+            return None
+        key = question_key(q["question_text"])
+        if key in seen:
+            return None
+        seen.add(key)
+        return q
+
+    return accept
+
+
+def dedupe_questions(questions: Iterable[Dict], existing: Iterable[str] = ()) -> List[Dict]:
+    """Валидные вопросы без повторов между собой и с уже существующими текстами"""
+    accept = question_filter(existing)
+    return [q for q in map(accept, questions) if q is not None]
+
+
+# =========================
+# queue
+# =========================
+
+def enqueue_top_up(db: Session, topic_id: int, min_pool: int = QUESTION_POOL_MIN) -> bool:
+    """
+    Ставит задачу догенерации, если вопросов в теме меньше min_pool.
+    Повторная постановка при уже активной задаче игнорируется (уникальный индекс).
+    """
+    if crud.count_questions(db, topic_id) >= min_pool:
+        return False
+    if db.scalar(select(_recently_failed().where(QuestionJob.topic_id == topic_id).exists())):
+        return False
+    return _insert_jobs(db, [topic_id]) > 0
+
+
+def enqueue_low_topics(db: Session, min_pool: int = QUESTION_POOL_MIN) -> int:
+    """Задачи для всех доступных тем, где вопросов меньше min_pool"""
+    counts = (
+        select(Question.topic_id, func.count(Question.id).label("n"))
+        .group_by(Question.topic_id)
+        .subquery()
+    )
+    topic_ids = db.scalars(
+        select(Topic.id)
+        .outerjoin(counts, counts.c.topic_id == Topic.id)
+        .where(Topic.is_available.is_(True), func.coalesce(counts.c.n, 0) < min_pool,
+               Topic.id.notin_(_recently_failed()))
+    ).all()
+    return _insert_jobs(db, topic_ids)
+
+
+def _recently_failed():
+    return select(QuestionJob.topic_id).where(
+        QuestionJob.status == "failed",
+        QuestionJob.finished_at > datetime.utcnow() - QUESTION_JOB_RETRY_AFTER)
+
+
+def _insert_jobs(db: Session, topic_ids: List[int]) -> int:
+    if not topic_ids:
+        return 0
+    stmt = insert(QuestionJob.__table__).prefix_with("OR IGNORE")
+    result = db.execute(stmt, [
+        {"topic_id": topic_id, "status": "pending", "attempts": 0, "generated": 0,
+         "created_at": datetime.utcnow()}
+        for topic_id in topic_ids
+    ])
+    db.commit()
+    return result.rowcount or 0
+
+
+def claim_job(db: Session, worker_id: str) -> Optional[QuestionJob]:
+    """
+    Атомарно забирает следующую задачу: pending или running с истёкшей арендой.
+    UPDATE ... RETURNING выполняется одной командой, поэтому два воркера
+    не получат одну задачу.
+    """
+    now = datetime.utcnow()
+    next_id = (
+        select(QuestionJob.id)
+        .where(
+            (QuestionJob.status == "pending")
+            | ((QuestionJob.status == "running") & (QuestionJob.locked_at < now - QUESTION_JOB_LEASE))
+        )
+        .order_by(QuestionJob.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    job = db.scalars(
+        update(QuestionJob)
+        .where(QuestionJob.id == next_id)
+        .values(status="running", locked_by=worker_id, locked_at=now,
+                attempts=QuestionJob.attempts + 1)
+        .returning(QuestionJob)
+    ).first()
+    db.commit()
+    return job
+
+
+def _finish(db: Session, job_id: int, status: str, generated: int,
+            error: Optional[str] = None) -> None:
+    db.execute(
+        update(QuestionJob)
+        .where(QuestionJob.id == job_id)
+        .values(status=status, error=error, generated=generated,
+                finished_at=datetime.utcnow() if status in ("done", "failed") else None,
+                locked_by=None, locked_at=None)
+    )
+    db.commit()
+
+
+def fill_topic_to(db: Session, topic_id: int, target: int,
+                  generate: Callable[[int, Dict], List[Dict]],
+                  batch: int = QUESTION_POOL_BATCH, max_empty_rounds: int = 2,
+                  on_batch: Optional[Callable[[int], None]] = None) -> int:
+    """
+    Догенерирует вопросы темы до target партиями по batch: проверка, дедупликация
+    с уже существующими, bulk insert и commit каждой партии.
+    generate(число вопросов, json темы) -> список вопросов; on_batch(n) — после записи партии.
+    Возвращает число добавленных; если модель не даёт новых вопросов — RuntimeError.
+    """
+    topic = db.get(Topic, topic_id)
+    if topic is None or not topic.json:
+        raise ValueError("topic not found or has no content")
+
+    book_json = json.loads(topic.json)
+    existing = crud.get_question_texts(db, topic_id)
+    added = empty_rounds = 0
+    while len(existing) < target and empty_rounds < max_empty_rounds:
+        wanted = min(batch, target - len(existing))
+        fresh = dedupe_questions(generate(wanted, book_json), existing)[:wanted]
+        if not fresh:
+            empty_rounds += 1
+            continue
+        crud.bulk_create_questions(db, topic_id, fresh)
+        db.commit()
+        existing.extend(q["question_text"] for q in fresh)
+        added += len(fresh)
+        if on_batch is not None:
+            on_batch(len(fresh))
+
+    if len(existing) < target:
+        raise RuntimeError(f"pool {len(existing)}/{target}: model returned no new questions")
+    return added
+
+
+def run_job(db: Session, job: QuestionJob, generate: Callable[[int, Dict], List[Dict]],
+            min_pool: int = QUESTION_POOL_MIN, batch: int = QUESTION_POOL_BATCH) -> int:
+    """
+    Догенерирует вопросы темы до min_pool (fill_topic_to).
+    Ошибка возвращает задачу в очередь, после QUESTION_JOB_MAX_ATTEMPTS — failed.
+    """
+    job_id, topic_id, attempts = job.id, job.topic_id, job.attempts
+    generated = job.generated or 0
+
+    def count(n: int) -> None:
+        nonlocal generated
+        generated += n
+
+    try:
+        topic = db.get(Topic, topic_id)
+        if topic is None or not topic.json:
+            _finish(db, job_id, "failed", generated, "topic not found or has no content")
+            return 0
+        fill_topic_to(db, topic_id, min_pool, generate, batch=batch, on_batch=count)
+        _finish(db, job_id, "done", generated)
+    except Exception as e:
+        db.rollback()
+        status = "failed" if attempts >= QUESTION_JOB_MAX_ATTEMPTS else "pending"
+        _finish(db, job_id, status, generated, str(e)[:500])
+        print(f"⚠️ Question job {job_id} (topic {topic_id}) -> {status}: {str(e)[:100]}")
+    return generated
+
+
+def has_active_job(db: Session, topic_id: int) -> bool:
+    """Тема в очереди или её сейчас пополняет воркер"""
+    return bool(db.scalar(select(
+        select(QuestionJob.id)
+        .where(QuestionJob.topic_id == topic_id,
+               QuestionJob.status.in_(("pending", "running")))
+        .exists())))
+
+
+def queue_stats(db: Session) -> Dict[str, int]:
+    rows = db.execute(
+        select(QuestionJob.status, func.count(QuestionJob.id)).group_by(QuestionJob.status)
+    ).all()
+    return {status: n for status, n in rows}
@@ -1,31 +1,47 @@
 import os
 import re
-import json
+import time
+import asyncio
 import chromadb
 import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, AsyncIterator, Optional, Tuple
 import torch
 from langchain_core.documents import Document
-from langchain_ollama import OllamaLLM
 from langchain_huggingface import HuggingFaceEmbeddings
+from lib.concurrency import run_embedding, run_blocking, stage_limit
+from lib.semantic_cache import get_semantic_cache
+from lib.embedding_service import EmbeddingBatcher
+from lib.lexical_index import get_lexical_index
+from lib.llm_client import CHAT_SYSTEM_PREFIX, get_llm
+from lib.context_builder import build_context
+from lib.reranker import RERANK_CANDIDATES, get_reranker, rerank_async
+from lib.structured_output import parse_objects, with_format
+from lib.topic_scope import TOPIC_SCOPE_MIN_SIMILARITY, similarity, where_filter
 
 device = 'cuda' if torch.cuda.is_available() else 'cpu'
 
 # ---------- Настройка LLM ----------
-llm = OllamaLLM(
-    model="mistral",
-    base_url="http://localhost:11434",
-    temperature=0.1,
-    top_p=0.95,
-    num_predict=512,
-)
+# Параметры генерации и keep_alive — в lib/llm_client.py (профиль "chat")
+llm = get_llm("chat")
 
 # ---------- Модель эмбеддингов ----------
 # Используем ту же модель, что использовалась при создании коллекции
 embeddings = HuggingFaceEmbeddings(
     model_name="intfloat/multilingual-e5-large",  # Размерность 1024
     model_kwargs={'device': device},
-    encode_kwargs={'normalize_embeddings': False}
+    # Нормированные векторы (как в build_index.py): для l2 Chroma это даёт
+    # сходство 1 - distance / 2, на нём держится порог поиска по теме
+    encode_kwargs={'normalize_embeddings': True}
+)
+
+# Микробатчинг и LRU-кэш эмбеддингов запросов чата.
+# embed_documents и embed_query у HuggingFaceEmbeddings кодируют одинаково,
+# поэтому батч считается одним вызовом embed_documents.
+embedding_batcher = EmbeddingBatcher(
+    embeddings.embed_documents,
+    max_batch=int(os.getenv("EMBED_BATCH_SIZE", "16")),
+    window_ms=float(os.getenv("EMBED_BATCH_WINDOW_MS", "5")),
+    cache_size=int(os.getenv("EMBED_CACHE_SIZE", "2048")),
 )
 
 # ---------- Улучшенная очистка текста ----------
@@ -110,6 +126,15 @@ def load_and_clean_documents(limit: int = 30):
 
 # ---------- Кастомный генератор вопросов ----------
 
+QA_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question": {"type": "string"},
+        "answer": {"type": "string"}
+    },
+    "required": ["question", "answer"]
+}
+
 
 class CustomQuestionGenerator:
     """Кастомный генератор вопросов для обхода проблем RAGAS"""
@@ -140,38 +165,26 @@ class CustomQuestionGenerator:
 
 Сгенерируй только JSON, без дополнительного текста:"""
 
+        response = ""
         for attempt in range(self.max_retries):
             try:
-                response = self.llm.invoke(prompt).strip()
+                response = with_format(self.llm, QA_SCHEMA).invoke(prompt).strip()
 
-                # Очистка ответа
-                response = re.sub(r'```json\s*|\s*```', '', response)
-                response = re.sub(r'^.*?\{', '{', response, flags=re.DOTALL)
-                response = re.sub(r'\}.*?$', '}', response, flags=re.DOTALL)
-
-                # Парсинг JSON
-                data = json.loads(response)
-
-                # Валидация полей
-                required_fields = ["question", "answer"]
-                for field in required_fields:
-                    if field not in data:
-                        raise ValueError(f"Missing field: {field}")
-
-                # Очистка значений
-                data["question"] = clean_text_for_ragas(
-                    data["question"]).strip()
-                data["answer"] = clean_text_for_ragas(data["answer"]).strip()
+                # Первый законченный объект с обоими полями; текст вокруг JSON не мешает
+                data = next((obj for obj in parse_objects(response)
+                             if obj.get("question") and obj.get("answer")), None)
+                if data is None:
+                    raise ValueError("no complete question/answer object")
 
                 return {
-                    "question": data["question"],
-                    "ground_truth": data["answer"],
+                    "question": clean_text_for_ragas(str(data["question"])).strip(),
+                    "ground_truth": clean_text_for_ragas(str(data["answer"])).strip(),
                     "context": doc_text[:1000],
                     "success": True
                 }
 
-            except json.JSONDecodeError as e:
-                print(f"  Attempt {attempt + 1}: JSON decode error")
+            except ValueError:
+                print(f"  Attempt {attempt + 1}: no valid JSON in response")
                 if attempt == self.max_retries - 1:
                     return self.extract_qa_manually(response, doc_text)
             except Exception as e:
@@ -291,29 +304,30 @@ def retrieve_docs_with_embeddings(question: str, collection, embeddings_model, k
             return {"documents": [], "metadatas": [], "distances": []}
 
 
-def answer_question(question: str, llm, context: str = "") -> Dict[str, Any]:
-    """Генерация ответа на вопрос"""
-    try:
-        if context:
-            prompt = f"""
-Ты — AI-репетитор по техническим дисциплинам. Отвечай подробно, шаг за шагом.
-Используй ТОЛЬКО информацию из блока "Контекст". Ответ должен содержать все ключевые шаги.
-Если информации недостаточно — честно скажи.
-
----
-Контекст:
+def build_prompt(question: str, context: str = "") -> str:
+    """
+    Сборка промпта для генерации ответа.
+    Начинается с неизменного CHAT_SYSTEM_PREFIX (байт в байт), переменная
+    часть — после него, чтобы Ollama переиспользовала префилл префикса.
+    """
+    if context:
+        return f"""{CHAT_SYSTEM_PREFIX}Контекст:
 {context}
 
 Вопрос студента:
 {question}
 """
-        else:
-            prompt = f"""Ответь на вопрос: {question}
+    return f"""Ответь на вопрос: {question}
 
 Если не знаешь ответ, скажи "Не могу ответить на этот вопрос".
 
 Ответ:"""
 
+
+def answer_question(question: str, llm, context: str = "") -> Dict[str, Any]:
+    """Генерация ответа на вопрос"""
+    try:
+        prompt = build_prompt(question, context)
         response = llm.invoke(prompt)
         return {"answer": str(response).strip(), "success": True}
     except Exception as e:
@@ -325,18 +339,19 @@ def get_rag_answer(question: str, collection, k=3) -> dict:
     """
     Полный цикл RAG: поиск + генерация ответа.
     """
-    # 1. Поиск релевантных документов
+    # 1. Поиск релевантных документов (с запасом под переранжирование)
+    reranker = get_reranker()
     retrieved = retrieve_docs_with_embeddings(
         question,
         collection,
         embeddings,
-        k=k
+        k=max(k, RERANK_CANDIDATES) if reranker is not None else k
     )
+    if reranker is not None:
+        retrieved = reranker.rerank(question, retrieved, k)
 
     # 2. Подготовка контекста
-    context = ""
-    if retrieved["documents"]:
-        context = " ".join(retrieved["documents"])
+    context = build_context(retrieved)
 
     # 3. Генерация ответа
     answer_result = answer_question(question, llm, context)
@@ -349,3 +364,346 @@ def get_rag_answer(question: str, collection, k=3) -> dict:
         "sources": retrieved["metadatas"],
         "distances": retrieved["distances"]
     }
+
+
+# ---------- Потоковый RAG-ответ ----------
+def format_sources(retrieved: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Краткое описание найденных источников для клиента"""
+    sources = []
+    for meta, distance in zip(retrieved["metadatas"], retrieved["distances"]):
+        meta = meta or {}
+        sources.append({
+            "title": meta.get("title", ""),
+            "url": meta.get("url", ""),
+            "section": meta.get("section", ""),
+            "chunk_id": meta.get("chunk_id"),
+            "distance": distance
+        })
+    return sources
+
+
+def stream_rag_answer(question: str, collection, k=3) -> Iterator[Dict[str, Any]]:
+    """
+    Потоковый цикл RAG: сначала отдаёт найденные источники,
+    затем токены ответа по мере генерации.
+
+    События: {"event": "sources" | "token" | "error" | "done", "data": ...}.
+    В событии "done" передаётся текст ответа; при сбое модели перед ним
+    приходит "error", а в "done" — только то, что успели сгенерировать.
+    """
+    retrieved = retrieve_docs_with_embeddings(
+        question,
+        collection,
+        embeddings,
+        k=k
+    )
+    yield {"event": "sources", "data": format_sources(retrieved)}
+
+    context = build_context(retrieved)
+    prompt = build_prompt(question, context)
+
+    parts = []
+    try:
+        for chunk in llm.stream(prompt):
+            if not chunk:
+                continue
+            parts.append(chunk)
+            yield {"event": "token", "data": chunk}
+        success = True
+    except Exception as e:
+        success = False
+        yield {"event": "error", "data": {"message": f"Ошибка генерации: {str(e)[:100]}"}}
+
+    yield {
+        "event": "done",
+        "data": {"answer": "".join(parts).strip(), "success": success}
+    }
+
+
+# ---------- Асинхронный RAG ----------
+async def retrieve_docs_with_embeddings_async(question: str, collection, embeddings_model, k: int = 3,
+                                              embed=None, where: Optional[Dict] = None) -> Dict[str, Any]:
+    """
+    Неблокирующий поиск: эмбеддинг считается в ограниченном пуле потоков
+    (или корутиной embed, например микробатчером), запрос к Chroma —
+    в отдельном потоке с лимитом стадии "retrieve".
+    where — фильтр метаданных Chroma (например, по url документов темы).
+    """
+    try:
+        if embed is not None:
+            question_embedding = await embed(question)
+        else:
+            question_embedding = await run_embedding(
+                embeddings_model.embed_query, question)
+
+        filters = {"where": where} if where else {}
+        results = await run_blocking("retrieve", lambda: collection.query(
+            query_embeddings=[question_embedding],
+            n_results=k,
+            include=["documents", "metadatas", "distances"],
+            **filters
+        ))
+
+        return {
+            "ids": results["ids"][0] if results["ids"] else [],
+            "documents": results["documents"][0] if results["documents"] else [],
+            "metadatas": results["metadatas"][0] if results["metadatas"] else [],
+            "distances": results["distances"][0] if results["distances"] else [],
+            "embedding": question_embedding
+        }
+    except Exception as e:
+        print(f"  Error retrieving docs: {str(e)[:100]}")
+        if where:
+            # Запасной поиск фильтр не поддерживает: решение о расширении
+            # на весь корпус принимает retrieve_scoped_async
+            raise
+        return await run_blocking(
+            "retrieve", retrieve_docs_with_embeddings,
+            question, collection, embeddings_model, k)
+
+
+# ---------- Гибридный поиск (BM25 + эмбеддинги) ----------
+HYBRID_DENSE_K = int(os.getenv("HYBRID_DENSE_K", "10"))
+HYBRID_LEXICAL_K = int(os.getenv("HYBRID_LEXICAL_K", "10"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], rrf_k: int = RRF_K) -> List[Tuple[str, float]]:
+    """RRF: score(id) = Σ 1 / (rrf_k + позиция в списке), позиции с 1"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+async def retrieve_hybrid_async(question: str, collection, k: int = 3, embed=None,
+                                dense_k: int = HYBRID_DENSE_K,
+                                lexical_k: int = HYBRID_LEXICAL_K,
+                                scope: Optional[Dict] = None) -> Dict[str, Any]:
+    """
+    Плотный поиск в Chroma и BM25 по тем же чанкам параллельно,
+    слияние reciprocal rank fusion. Чанки, найденные только BM25,
+    догружаются из Chroma по id (distance для них None).
+    scope (lib.topic_scope.topic_scope) ограничивает оба поиска документами темы.
+    """
+    index = get_lexical_index()
+    # Без id чанков темы BM25 не ограничить — ищем только плотным поиском по url
+    if scope is not None and not scope.get("chunk_ids"):
+        index = None
+    dense_task = retrieve_docs_with_embeddings_async(
+        question, collection, embeddings, k=max(k, dense_k), embed=embed,
+        where=where_filter(scope) if scope else None)
+    if index is None:
+        return _top_k(await dense_task, k)
+
+    lexical_task = run_blocking("retrieve", index.search, question, lexical_k,
+                                scope["chunk_ids"] if scope else None)
+    dense, lexical = await asyncio.gather(dense_task, lexical_task, return_exceptions=True)
+    if isinstance(dense, BaseException):
+        raise dense
+    if isinstance(lexical, BaseException) or not dense.get("ids"):
+        return _top_k(dense, k)
+
+    fused = reciprocal_rank_fusion([dense["ids"], [chunk_id for chunk_id, _ in lexical]])[:k]
+    found = {
+        chunk_id: (doc, meta, dist)
+        for chunk_id, doc, meta, dist in zip(
+            dense["ids"], dense["documents"], dense["metadatas"], dense["distances"])
+    }
+    missing = [chunk_id for chunk_id, _ in fused if chunk_id not in found]
+    if missing:
+        extra = await run_blocking("retrieve", lambda: collection.get(
+            ids=missing, include=["documents", "metadatas"]))
+        for chunk_id, doc, meta in zip(extra["ids"], extra["documents"], extra["metadatas"]):
+            found[chunk_id] = (doc, meta, None)
+
+    fused = [(chunk_id, score) for chunk_id, score in fused if chunk_id in found]
+    return {
+        "ids": [chunk_id for chunk_id, _ in fused],
+        "documents": [found[chunk_id][0] for chunk_id, _ in fused],
+        "metadatas": [found[chunk_id][1] for chunk_id, _ in fused],
+        "distances": [found[chunk_id][2] for chunk_id, _ in fused],
+        "fusion_scores": [score for _, score in fused],
+        "embedding": dense.get("embedding")
+    }
+
+
+async def retrieve_scoped_async(question: str, collection, k: int = 3, embed=None,
+                                scope: Optional[Dict] = None,
+                                min_similarity: float = TOPIC_SCOPE_MIN_SIMILARITY) -> Dict[str, Any]:
+    """
+    Поиск сначала по документам темы; если там ничего нет или лучший
+    плотный результат слабее min_similarity — по всему корпусу.
+    В результате "scope": "topic" или "global".
+    """
+    if scope is not None:
+        try:
+            retrieved = await retrieve_hybrid_async(question, collection, k=k, embed=embed, scope=scope)
+        except Exception as e:
+            print(f"  Topic-scoped retrieval failed, searching globally: {str(e)[:100]}")
+            retrieved = {}
+        best = max((similarity(d) for d in retrieved.get("distances") or [] if d is not None),
+                   default=None)
+        if best is not None and best >= min_similarity:
+            return {**retrieved, "scope": "topic"}
+    retrieved = await retrieve_hybrid_async(question, collection, k=k, embed=embed)
+    return {**retrieved, "scope": "global"}
+
+
+def _top_k(retrieved: Dict[str, Any], k: int) -> Dict[str, Any]:
+    """Первые k результатов поиска (списочные поля обрезаются, embedding остаётся)"""
+    return {key: value[:k] if isinstance(value, list) and key != "embedding" else value
+            for key, value in retrieved.items()}
+
+
+def ensure_lexical_index(chroma_client) -> None:
+    """Заполнение BM25-индекса из Chroma, если он ещё пуст"""
+    index = get_lexical_index()
+    if index is None or chroma_client is None:
+        return
+    try:
+        collection = chroma_client.get_collection('cloud_docs')
+    except Exception:
+        return
+    index.sync_from_collection(collection)
+
+
+async def answer_question_async(question: str, llm, context: str = "") -> Dict[str, Any]:
+    """Генерация ответа через асинхронный клиент Ollama"""
+    try:
+        prompt = build_prompt(question, context)
+        async with stage_limit("llm"):
+            response = await llm.ainvoke(prompt)
+        return {"answer": str(response).strip(), "success": True}
+    except Exception as e:
+        return {"answer": f"Ошибка генерации: {str(e)[:100]}", "success": False}
+
+
+async def retrieve_async(question: str, collection, k=3, scope: Optional[Dict] = None) -> Dict[str, Any]:
+    """
+    Гибридный поиск контекста (в пределах темы, если передан scope);
+    эмбеддинг запроса — через микробатчер, повторный поиск по корпусу берёт его из кэша.
+    С реранкером достаётся RERANK_CANDIDATES кандидатов, в ответ идут k лучших.
+    """
+    candidates = max(k, RERANK_CANDIDATES) if get_reranker() is not None else k
+    retrieved = await retrieve_scoped_async(
+        question,
+        collection,
+        k=candidates,
+        embed=embedding_batcher.embed,
+        scope=scope
+    )
+    return await rerank_async(question, retrieved, k)
+
+
+async def get_rag_answer_async(question: str, collection, k=3, topic_id: int = None) -> dict:
+    """Асинхронный вариант get_rag_answer"""
+    retrieved = await retrieve_async(question, collection, k=k)
+    return await answer_from_retrieved_async(question, retrieved, topic_id=topic_id)
+
+
+def _cache_key(retrieved: Dict[str, Any]):
+    """(эмбеддинг, id чанков) для семантического кэша или None"""
+    if get_semantic_cache() is None or retrieved.get("embedding") is None:
+        return None
+    return retrieved["embedding"], retrieved.get("ids", [])
+
+
+async def cached_answer_async(retrieved: Dict[str, Any], topic_id: int = None):
+    """Ответ из семантического кэша или None"""
+    key = _cache_key(retrieved)
+    if key is None:
+        return None
+    return await asyncio.to_thread(get_semantic_cache().lookup, key[0], topic_id, key[1])
+
+
+async def remember_answer_async(retrieved: Dict[str, Any], topic_id: int, answer: str, gen_ms: float) -> None:
+    """Сохранение сгенерированного ответа в семантический кэш (пустые ответы не кэшируются)"""
+    key = _cache_key(retrieved)
+    if key is None or not (answer or "").strip():
+        return
+    await asyncio.to_thread(get_semantic_cache().store, key[0], topic_id, key[1], answer, gen_ms)
+
+
+async def answer_from_retrieved_async(question: str, retrieved: Dict[str, Any], topic_id: int = None,
+                                      remember: bool = True) -> dict:
+    """
+    Генерация ответа по уже найденному контексту (с семантическим кэшем).
+    remember=False — ответ в кэш не пишется: так делает спекулятивная генерация,
+    пока нет вердикта модерации (сохраняет сама, по полю gen_ms).
+    """
+    result = {
+        "contexts": retrieved["documents"],
+        "sources": retrieved["metadatas"],
+        "distances": retrieved["distances"]
+    }
+
+    cached = await cached_answer_async(retrieved, topic_id)
+    if cached is not None:
+        return {"answer": cached["answer"], "success": True, "cached": True, **result}
+
+    context = build_context(retrieved)
+
+    t0 = time.perf_counter()
+    answer_result = await answer_question_async(question, llm, context)
+    gen_ms = (time.perf_counter() - t0) * 1000
+    if answer_result["success"] and remember:
+        await remember_answer_async(retrieved, topic_id, answer_result["answer"], gen_ms)
+
+    return {
+        "answer": answer_result["answer"],
+        "success": answer_result["success"],
+        "cached": False,
+        "gen_ms": gen_ms,
+        **result
+    }
+
+
+async def stream_rag_answer_async(question: str, collection, k=3,
+                                  retrieved: Dict[str, Any] = None,
+                                  topic_id: int = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Асинхронный вариант stream_rag_answer (те же события).
+    Если retrieved передан, повторный поиск не выполняется.
+    Ответ из семантического кэша отдаётся одним событием "token".
+    """
+    if retrieved is None:
+        retrieved = await retrieve_async(question, collection, k=k)
+    yield {"event": "sources", "data": format_sources(retrieved)}
+
+    cached = await cached_answer_async(retrieved, topic_id)
+    if cached is not None:
+        yield {"event": "token", "data": cached["answer"]}
+        yield {
+            "event": "done",
+            "data": {"answer": cached["answer"], "success": True, "cached": True}
+        }
+        return
+
+    context = build_context(retrieved)
+    prompt = build_prompt(question, context)
+
+    t0 = time.perf_counter()
+    parts = []
+    try:
+        async with stage_limit("llm"):
+            async for chunk in llm.astream(prompt):
+                if not chunk:
+                    continue
+                parts.append(chunk)
+                yield {"event": "token", "data": chunk}
+        success = True
+    except Exception as e:
+        success = False
+        yield {"event": "error", "data": {"message": f"Ошибка генерации: {str(e)[:100]}"}}
+
+    answer = "".join(parts).strip()
+    if success:
+        await remember_answer_async(
+            retrieved, topic_id, answer, (time.perf_counter() - t0) * 1000)
+
+    yield {
+        "event": "done",
+        "data": {"answer": answer, "success": success, "cached": False}
+    }
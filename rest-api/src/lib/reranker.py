@@ -0,0 +1,218 @@
+# rest-api\src\lib\reranker.py
+import os
+import time
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+from lib.concurrency import run_blocking, stage_limit
+
+
+# Сколько кандидатов достаётся из поиска перед переранжированием
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "12"))
+
+
+class Reranker:
+    """
+    Переранжирование найденных чанков кросс-энкодером на CPU.
+
+    Модель оценивает пары (вопрос, чанк) одним батчем и оставляет k лучших.
+    Стадия пропускается (остаётся порядок поиска), если модель ещё не загружена
+    (warm_up при старте API), все слоты стадии "rerank" заняты или оценка
+    времени по прошлым запросам превышает budget_ms. Раз в probe_interval_s
+    секунд такой запрос всё же переранжируется, чтобы оценка могла снизиться.
+    """
+
+    def __init__(self, model_name: str, budget_ms: float = 150.0, batch_size: int = 16,
+                 max_length: int = 512, probe_interval_s: float = 30.0):
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.probe_interval_s = probe_interval_s
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        # Скользящая оценка стоимости одной пары, мс
+        self.pair_ms: Optional[float] = None
+        # Время последнего замера или пробного прогона (time.monotonic)
+        self._probed_at = 0.0
+        self._probing = False
+
+        self.calls = 0
+        self.reranked = 0
+        self.skipped_loading = 0
+        self.skipped_busy = 0
+        self.skipped_budget = 0
+        self.probes = 0
+        self.rerank_ms = 0.0
+        self.max_rerank_ms = 0.0
+        self.rank_shift = 0.0
+        self.kept = 0
+        self.top1_changed = 0
+        self.promoted = 0
+
+    def _get_model(self):
+        with self._load_lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(
+                    self.model_name, device='cpu', max_length=self.max_length)
+            return self._model
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def warm_up(self) -> None:
+        """Загрузка модели (при первом запуске — и скачивание) и пробный прогон вне запросов"""
+        try:
+            t0 = time.perf_counter()
+            self._get_model().predict([("вопрос", "документ")], show_progress_bar=False)
+            print(f"🔥 Reranker {self.model_name} loaded in {time.perf_counter() - t0:.1f}s")
+        except Exception as e:
+            print(f"⚠️ Reranker warm-up failed: {str(e)[:100]}")
+
+    def count_call(self, skipped: Optional[str] = None) -> None:
+        """Учёт вызова стадии; skipped — причина пропуска (loading, busy, budget)"""
+        with self._stats_lock:
+            self.calls += 1
+            if skipped is not None:
+                name = f"skipped_{skipped}"
+                setattr(self, name, getattr(self, name) + 1)
+
+    def affordable(self, n: int) -> int:
+        """
+        Сколько из n кандидатов укладывается в бюджет по прошлым замерам.
+        Если оценка давно не обновлялась, разрешается пробный прогон всех n:
+        иначе после разового замедления стадия не включилась бы до перезапуска.
+        """
+        with self._stats_lock:
+            if self.pair_ms is None or self.pair_ms * n <= self.budget_ms:
+                return n
+            now = time.monotonic()
+            if now - self._probed_at >= self.probe_interval_s:
+                self._probed_at = now
+                self._probing = True
+                self.probes += 1
+                return n
+            return int(self.budget_ms / self.pair_ms)
+
+    def score(self, question: str, documents: List[str]) -> List[float]:
+        pairs = [(question, doc) for doc in documents]
+        scores = self._get_model().predict(
+            pairs, batch_size=self.batch_size, show_progress_bar=False)
+        return [float(s) for s in scores]
+
+    def rerank(self, question: str, retrieved: Dict[str, Any], k: int) -> Dict[str, Any]:
+        """Результат поиска в новом порядке, обрезанный до k, с полем rerank_scores"""
+        documents = retrieved.get("documents") or []
+        if len(documents) <= 1:
+            return retrieved
+
+        self._get_model()  # загрузка модели не входит в замер
+        t0 = time.perf_counter()
+        scores = self.score(question, documents)
+        elapsed = (time.perf_counter() - t0) * 1000
+
+        order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)[:k]
+        self._record(order, len(documents), k, elapsed)
+
+        reranked = {
+            key: [value[i] for i in order] if isinstance(value, list) and key != "embedding"
+            and len(value) == len(documents) else value
+            for key, value in retrieved.items()
+        }
+        reranked["rerank_scores"] = [scores[i] for i in order]
+        return reranked
+
+    def _record(self, order: List[int], n: int, k: int, elapsed: float) -> None:
+        with self._stats_lock:
+            per_pair = elapsed / n
+            # Пробный прогон заменяет оценку целиком: скользящее среднее
+            # после разового замедления опускалось бы слишком долго
+            if self.pair_ms is None or self._probing:
+                self.pair_ms = per_pair
+            else:
+                self.pair_ms = 0.8 * self.pair_ms + 0.2 * per_pair
+            self._probing = False
+            self._probed_at = time.monotonic()
+            self.reranked += 1
+            self.rerank_ms += elapsed
+            self.max_rerank_ms = max(self.max_rerank_ms, elapsed)
+            self.rank_shift += sum(abs(old - new) for new, old in enumerate(order))
+            self.kept += len(order)
+            self.top1_changed += order[0] != 0
+            self.promoted += sum(old >= k for old in order)
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                "model": self.model_name,
+                "budget_ms": self.budget_ms,
+                "loaded": self.loaded,
+                "calls": self.calls,
+                "reranked": self.reranked,
+                "skipped_loading": self.skipped_loading,
+                "skipped_busy": self.skipped_busy,
+                "skipped_budget": self.skipped_budget,
+                "probes": self.probes,
+                "avg_rerank_ms": round(self.rerank_ms / self.reranked, 1) if self.reranked else 0.0,
+                "max_rerank_ms": round(self.max_rerank_ms, 1),
+                "est_pair_ms": round(self.pair_ms, 2) if self.pair_ms is not None else None,
+                # Среднее смещение позиции оставленного чанка
+                "avg_rank_shift": round(self.rank_shift / self.kept, 2) if self.kept else 0.0,
+                "top1_changed_rate": self.top1_changed / self.reranked if self.reranked else 0.0,
+                # Доля оставленных чанков, которые без переранжирования не попали бы в top-k
+                "promoted_rate": self.promoted / self.kept if self.kept else 0.0
+            }
+
+
+@lru_cache(maxsize=1)
+def get_reranker() -> Optional[Reranker]:
+    """Общий реранкер процесса; None, если отключён через RERANK=0"""
+    if os.getenv("RERANK", "1") == "0":
+        return None
+    return Reranker(
+        model_name=os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"),
+        budget_ms=float(os.getenv("RERANK_BUDGET_MS", "150")),
+        batch_size=int(os.getenv("RERANK_BATCH_SIZE", "16")),
+        probe_interval_s=float(os.getenv("RERANK_PROBE_SECONDS", "30")),
+    )
+
+
+async def rerank_async(question: str, retrieved: Dict[str, Any], k: int) -> Dict[str, Any]:
+    """
+    Переранжирование в пуле потоков стадии "rerank". Без реранкера, пока модель
+    не загружена, при занятой стадии или нехватке бюджета возвращаются первые
+    k результатов поиска: загрузка модели не должна попадать в запрос.
+    """
+    reranker = get_reranker()
+    if reranker is None:
+        return _first_k(retrieved, k)
+
+    if not reranker.loaded:
+        reranker.count_call("loading")
+        return _first_k(retrieved, k)
+    if stage_limit("rerank").locked():
+        reranker.count_call("busy")
+        return _first_k(retrieved, k)
+    # Не укладываемся — переранжируем только начало списка, а если и оно
+    # не больше k, порядок не изменится и стадия пропускается
+    n = reranker.affordable(len(retrieved.get("documents") or []))
+    if n <= k:
+        reranker.count_call("budget")
+        return _first_k(retrieved, k)
+    reranker.count_call()
+    retrieved = _first_k(retrieved, n)
+
+    try:
+        return await run_blocking("rerank", reranker.rerank, question, retrieved, k)
+    except Exception as e:
+        print(f"  Rerank failed: {str(e)[:100]}")
+        return _first_k(retrieved, k)
+
+
+def _first_k(retrieved: Dict[str, Any], k: int) -> Dict[str, Any]:
+    return {key: value[:k] if isinstance(value, list) and key != "embedding" else value
+            for key, value in retrieved.items()}
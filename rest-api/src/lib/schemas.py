@@ -50,6 +50,41 @@ class TopicResponse(TopicBase):
         from_attributes = True
 
 
+class TopicSummary(BaseModel):
+    """Тема для списка — без тяжёлой колонки json"""
+    id: int
+    title: str
+    description: str | None = None
+    image: str | None = None
+    is_available: bool
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class TopicSummaryPage(BaseModel):
+    items: List[TopicSummary]
+    next_after_id: Optional[int] = None
+
+
+class TopicSearchResult(BaseModel):
+    id: int
+    title: str
+    description: str | None = None
+    image: str | None = None
+    snippet: str | None = None
+    rank: float
+
+
+class TopicContent(BaseModel):
+    id: int
+    json: str | None = None
+
+    class Config:
+        from_attributes = True
+
+
 # Question schemas
 
 
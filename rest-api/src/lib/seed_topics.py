@@ -1,8 +1,10 @@
 # rest-api\src\lib\seed_topics.py
 import json
 import re
+import hashlib
 import crud
 import lib.schemas as schemas
+from lib.topic_search import index_topics
 
 
 # =========================
@@ -79,24 +81,57 @@ def build_topic_fields(data: dict):
     return title, description, content
 
 
+def topic_hash(title: str, description: str, topic_json: str) -> str:
+    return hashlib.sha256(
+        "\n".join([title, description, topic_json]).encode("utf-8")
+    ).hexdigest()
+
+
 # =========================
 # seed function
 # =========================
 
-def seed_topics_from_jsonl(db, path: str):
-    """
-    Сид тем из JSONL-файла
+SEED_BATCH_SIZE = 500
+
+
+def seed_topics_from_jsonl(db, path: str, batch_size: int = SEED_BATCH_SIZE):
     """
+    Сид тем из JSONL-файла.
 
-    if crud.get_topics(db, skip=0, limit=1):
-        print("📚 Topics already exist")
-        return
+    Файл читается потоково, существующие темы загружаются одним запросом
+    (title -> id, hash). Новые темы вставляются, изменившиеся обновляются
+    по title пачками по batch_size строк в одной транзакции, неизменные
+    не трогаются.
+    """
 
     print("🌱 Seeding topics from JSONL:", path)
 
+    existing = crud.get_topic_hashes(db)
+    seen = set()
+    to_create = []
+    to_update = []
+    # текст для поискового индекса, в том же порядке, что to_create / to_update
+    create_search = []
+    update_search = []
+
     created = 0
+    updated = 0
+    unchanged = 0
     skipped = 0
 
+    def flush():
+        nonlocal created, updated
+        ids = crud.bulk_create_topics(db, to_create)
+        crud.bulk_update_topics(db, to_update)
+        for topic_id, doc in zip(ids, create_search):
+            doc["id"] = topic_id
+        index_topics(db, create_search + update_search)
+        db.commit()
+        created += len(to_create)
+        updated += len(to_update)
+        for batch in (to_create, to_update, create_search, update_search):
+            batch.clear()
+
     with open(path, "r", encoding="utf-8") as f:
         for line_no, line in enumerate(f, start=1):
             line = line.strip()
@@ -112,30 +147,45 @@ def seed_topics_from_jsonl(db, path: str):
 
             title, description, clean_content = build_topic_fields(data)
 
-            if not title or not clean_content:
+            if not title or not clean_content or title in seen:
                 skipped += 1
                 continue
-
-            find_topic = crud.get_topic_title(db=db, title=title)
-
-            if (find_topic == None):
-                topic = schemas.TopicCreate(
-                    title=title,
-                    description=description,
-                    image="default.png",
-                    json=json.dumps(
-                        {
-                            **data,
-                            "clean_content": clean_content
-                        },
-                        ensure_ascii=False
-                    )
+            seen.add(title)
+
+            topic = schemas.TopicCreate(
+                title=title,
+                description=description,
+                image="default.png",
+                json=json.dumps(
+                    {
+                        **data,
+                        "clean_content": clean_content
+                    },
+                    ensure_ascii=False
                 )
+            )
+            content_hash = topic_hash(topic.title, topic.description, topic.json)
+
+            search_doc = {"title": title, "description": description, "content": clean_content}
+            found = existing.get(title)
+            if found is None:
+                to_create.append({**topic.dict(), "content_hash": content_hash})
+                create_search.append(search_doc)
+            elif found[1] != content_hash:
+                to_update.append({
+                    "id": found[0],
+                    "description": topic.description,
+                    "json": topic.json,
+                    "content_hash": content_hash
+                })
+                update_search.append({**search_doc, "id": found[0]})
             else:
-                skipped += 1
-                
-            crud.create_topic(db=db, topic=topic)
-            created += 1
+                unchanged += 1
+
+            if len(to_create) + len(to_update) >= batch_size:
+                flush()
+
+    flush()
 
-    print(f"✅ Topics created: {created}")
+    print(f"✅ Topics created: {created}, updated: {updated}, unchanged: {unchanged}")
     print(f"⏭️ Skipped: {skipped}")
@@ -0,0 +1,201 @@
+# rest-api\src\lib\semantic_cache.py
+import os
+import json
+import time
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Dict, Optional, Sequence
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Семантический кэш ответов репетитора.
+
+    Хранит (эмбеддинг вопроса, topic_id, id найденных чанков, ответ) в SQLite
+    рядом с базой Chroma. Ответ переиспользуется, если косинусное сходство
+    вопросов не ниже threshold и (при match_chunks) найдены те же чанки.
+    Вытеснение — LRU по времени последнего использования, не больше max_entries.
+    """
+
+    def __init__(self, path: str, threshold: float = 0.95, max_entries: int = 5000,
+                 match_chunks: bool = True):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.match_chunks = match_chunks
+
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self.lookup_ms = 0.0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS semantic_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic_id INTEGER,
+                chunk_ids TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                gen_ms REAL NOT NULL DEFAULT 0,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_semantic_cache_last_used ON semantic_cache(last_used)")
+        self._conn.commit()
+
+        # topic_id -> {id строки: запись}; матрицы векторов строятся лениво
+        self._topics: Dict[Optional[int], Dict[int, Dict]] = {}
+        self._matrices: Dict[Optional[int], tuple] = {}
+        self._load()
+
+    # ---------- служебное ----------
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    @staticmethod
+    def _chunk_key(chunk_ids: Sequence[str]) -> str:
+        return json.dumps(sorted(chunk_ids))
+
+    def _load(self) -> None:
+        rows = self._conn.execute(
+            "SELECT id, topic_id, chunk_ids, embedding, answer, gen_ms, last_used FROM semantic_cache"
+        ).fetchall()
+        for row_id, topic_id, chunk_ids, blob, answer, gen_ms, last_used in rows:
+            self._topics.setdefault(topic_id, {})[row_id] = {
+                "vector": np.frombuffer(blob, dtype=np.float32),
+                "chunks": chunk_ids,
+                "answer": answer,
+                "gen_ms": gen_ms,
+                "last_used": last_used,
+            }
+        print(f"🧠 Semantic cache: {len(rows)} answers loaded from {self.path}")
+
+    def _matrix(self, topic_id: Optional[int]):
+        cached = self._matrices.get(topic_id)
+        if cached is None:
+            entries = self._topics.get(topic_id, {})
+            ids = list(entries.keys())
+            matrix = np.stack([entries[i]["vector"] for i in ids]) if ids else None
+            cached = (ids, matrix)
+            self._matrices[topic_id] = cached
+        return cached
+
+    def _evict(self) -> None:
+        total = sum(len(entries) for entries in self._topics.values())
+        overflow = total - self.max_entries
+        if overflow <= 0:
+            return
+        oldest = sorted(
+            ((entry["last_used"], topic_id, row_id)
+             for topic_id, entries in self._topics.items()
+             for row_id, entry in entries.items())
+        )[:overflow]
+        for _, topic_id, row_id in oldest:
+            del self._topics[topic_id][row_id]
+            self._matrices.pop(topic_id, None)
+        self._conn.executemany(
+            "DELETE FROM semantic_cache WHERE id = ?", [(row_id,) for _, _, row_id in oldest])
+
+    # ---------- API ----------
+
+    def lookup(self, embedding: Sequence[float], topic_id: Optional[int],
+               chunk_ids: Sequence[str]) -> Optional[Dict]:
+        """Сохранённый ответ для похожего вопроса или None"""
+        t0 = time.perf_counter()
+        query = self._normalize(embedding)
+        chunk_key = self._chunk_key(chunk_ids)
+
+        with self._lock:
+            ids, matrix = self._matrix(topic_id)
+            found = None
+            if matrix is not None:
+                sims = matrix @ query
+                for idx in np.argsort(-sims):
+                    if sims[idx] < self.threshold:
+                        break
+                    entry = self._topics[topic_id][ids[idx]]
+                    if self.match_chunks and entry["chunks"] != chunk_key:
+                        continue
+                    found = (ids[idx], entry, float(sims[idx]))
+                    break
+
+            if found is None:
+                self.misses += 1
+                self.lookup_ms += (time.perf_counter() - t0) * 1000
+                return None
+
+            row_id, entry, similarity = found
+            entry["last_used"] = time.time()
+            self._conn.execute(
+                "UPDATE semantic_cache SET last_used = ? WHERE id = ?",
+                (entry["last_used"], row_id))
+            self._conn.commit()
+            self.hits += 1
+            self.saved_ms += entry["gen_ms"]
+            self.lookup_ms += (time.perf_counter() - t0) * 1000
+            return {"answer": entry["answer"], "similarity": similarity}
+
+    def store(self, embedding: Sequence[float], topic_id: Optional[int],
+              chunk_ids: Sequence[str], answer: str, gen_ms: float) -> None:
+        """Сохранение нового ответа с вытеснением самых старых"""
+        vector = self._normalize(embedding)
+        chunk_key = self._chunk_key(chunk_ids)
+        now = time.time()
+
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO semantic_cache (topic_id, chunk_ids, embedding, answer, gen_ms, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (topic_id, chunk_key, vector.tobytes(), answer, gen_ms, now))
+            self._topics.setdefault(topic_id, {})[cur.lastrowid] = {
+                "vector": vector,
+                "chunks": chunk_key,
+                "answer": answer,
+                "gen_ms": gen_ms,
+                "last_used": now,
+            }
+            self._matrices.pop(topic_id, None)
+            self._evict()
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": sum(len(entries) for entries in self._topics.values()),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "saved_ms": round(self.saved_ms, 1),
+                "avg_lookup_ms": round(self.lookup_ms / total, 3) if total else 0.0
+            }
+
+
+@lru_cache(maxsize=1)
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """Общий кэш процесса; None, если отключён через SEMANTIC_CACHE=0"""
+    if os.getenv("SEMANTIC_CACHE", "1") == "0":
+        return None
+    default_path = os.path.join(
+        os.environ.get('CHROMA_DIR', './db'), 'semantic_cache.sqlite')
+    path = os.getenv("SEMANTIC_CACHE_PATH", default_path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return SemanticCache(
+        path=path,
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+        max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000")),
+        match_chunks=os.getenv("SEMANTIC_CACHE_MATCH_CHUNKS", "1") != "0",
+    )
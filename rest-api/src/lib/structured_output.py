@@ -0,0 +1,204 @@
+# rest-api\src\lib\structured_output.py
+import os
+import re
+import json
+import threading
+from typing import Any, AsyncIterable, Callable, Dict, Iterable, List, Optional, Union
+
+
+# schema — ответ ограничен JSON Schema (format в Ollama >= 0.5),
+# json — только валидный JSON, off — свободный текст (старые серверы и модели)
+STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "schema")
+
+# Вне строки важны только скобки объектов и кавычки, внутри — кавычка и экранирование
+OUTSIDE_STRING_RE = re.compile(r'[{}"]')
+INSIDE_STRING_RE = re.compile(r'["\\]')
+
+
+def output_format(schema: Dict) -> Union[Dict, str, None]:
+    """Значение параметра format Ollama для режима STRUCTURED_OUTPUT"""
+    if STRUCTURED_OUTPUT == "schema":
+        return schema
+    if STRUCTURED_OUTPUT == "json":
+        return "json"
+    return None
+
+
+def with_format(llm, schema: Dict):
+    """LLM с ограничением вывода по схеме (или без него, если режим выключен)"""
+    fmt = output_format(schema)
+    return llm.bind(format=fmt) if fmt is not None else llm
+
+
+class JsonObjectStream:
+    """
+    Инкрементальный разбор ответа модели: feed() возвращает каждый законченный
+    «листовой» объект (без вложенных объектов), как только пришла его закрывающая
+    скобка. Подходят и массив объектов, и обёртка {"questions": [...]};
+    текст вокруг JSON (```json, пояснения) и оборванный хвост пропускаются.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._stack: List[List[Any]] = []  # [начало объекта, есть ли вложенные объекты]
+        self._in_string = False
+        self._escape = False
+        self.invalid = 0
+
+    @property
+    def pending(self) -> bool:
+        """Есть незакрытый объект — ответ оборван"""
+        return bool(self._stack)
+
+    def feed(self, chunk: str) -> List[Dict]:
+        text = self._text + chunk
+        pos = self._pos
+        stack = self._stack
+        found = []
+        if self._escape and pos < len(text):
+            pos += 1
+            self._escape = False
+
+        while True:
+            m = (INSIDE_STRING_RE if self._in_string else OUTSIDE_STRING_RE).search(text, pos)
+            if m is None:
+                pos = len(text)
+                break
+            ch, pos = m.group(), m.end()
+            if self._in_string:
+                if ch == '"':
+                    self._in_string = False
+                elif pos < len(text):
+                    pos += 1  # экранированный символ
+                else:
+                    self._escape = True
+                    break
+            elif ch == '"':
+                self._in_string = bool(stack)
+            elif ch == '{':
+                stack.append([m.start(), False])
+            elif stack:
+                start, has_child = stack.pop()
+                if stack:
+                    stack[-1][1] = True
+                if not has_child:
+                    obj = self._loads(text[start:pos])
+                    if obj is not None:
+                        found.append(obj)
+
+        # Листом может оказаться только самый внутренний открытый объект:
+        # у внешних уже есть вложенный, поэтому текст до его начала не нужен
+        offset = stack[-1][0] if stack and not stack[-1][1] else pos
+        if offset:
+            for entry in stack:
+                entry[0] -= offset
+            text, pos = text[offset:], pos - offset
+        self._text, self._pos = text, pos
+        return found
+
+    def _loads(self, value: str) -> Optional[Dict]:
+        try:
+            obj = json.loads(value, strict=False)  # переводы строк внутри строк допустимы
+        except ValueError:
+            self.invalid += 1
+            return None
+        return obj if isinstance(obj, dict) else None
+
+
+def parse_objects(text: str) -> List[Dict]:
+    """Все законченные листовые объекты из готового ответа"""
+    return JsonObjectStream().feed(text or "")
+
+
+class StructuredOutputStats:
+    """Сколько объектов даёт разбор ответов и как часто приходится догенерировать"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.objects = 0
+        self.accepted = 0
+        self.invalid_json = 0
+        self.truncated = 0
+        self.stopped_early = 0
+        self.retries = 0
+
+    def record(self, stream: JsonObjectStream, objects: int, accepted: int,
+               stopped_early: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.objects += objects
+            self.accepted += accepted
+            self.invalid_json += stream.invalid
+            self.truncated += stream.pending and not stopped_early
+            self.stopped_early += stopped_early
+
+    def retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "mode": STRUCTURED_OUTPUT,
+                "calls": self.calls,
+                "objects": self.objects,
+                "accepted": self.accepted,
+                "invalid_json": self.invalid_json,
+                "truncated": self.truncated,
+                "stopped_early": self.stopped_early,
+                "retries": self.retries
+            }
+
+
+structured_stats = StructuredOutputStats()
+
+
+def collect_valid(chunks: Iterable[str], validate: Callable[[Dict], Optional[Dict]],
+                  limit: int) -> List[Dict]:
+    """
+    Разбирает поток ответа по мере генерации и оставляет объекты, прошедшие validate.
+    Набрав limit, закрывает поток: Ollama прекращает генерацию.
+    """
+    stream = JsonObjectStream()
+    items: List[Dict] = []
+    objects = 0
+    try:
+        for chunk in chunks:
+            for obj in stream.feed(chunk):
+                objects += 1
+                item = validate(obj)
+                if item is not None:
+                    items.append(item)
+            if len(items) >= limit:
+                break
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+        structured_stats.record(stream, objects, len(items), len(items) >= limit)
+    return items[:limit]
+
+
+async def acollect_valid(chunks: AsyncIterable[str], validate: Callable[[Dict], Optional[Dict]],
+                         limit: int) -> List[Dict]:
+    """Асинхронный вариант collect_valid"""
+    stream = JsonObjectStream()
+    items: List[Dict] = []
+    objects = 0
+    try:
+        async for chunk in chunks:
+            for obj in stream.feed(chunk):
+                objects += 1
+                item = validate(obj)
+                if item is not None:
+                    items.append(item)
+            if len(items) >= limit:
+                break
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        structured_stats.record(stream, objects, len(items), len(items) >= limit)
+    return items[:limit]
@@ -1,11 +1,84 @@
-from langchain_ollama import OllamaLLM
+from lib.llm_client import get_llm
+import os
 import re
-from typing import List, Tuple, Dict
+import hashlib
+import threading
+from collections import OrderedDict, Counter
+from functools import lru_cache
+from typing import List, Tuple, Dict, Optional
 import time
+from lib.concurrency import stage_limit
+from lib.moderation_lexicon import ObsceneLexicon
+
+
+AI_CHECK_PROMPT = """Текст содержит мат или оскорбления? Ответь одним словом: ДА или НЕТ.
+        Текст: {text}"""
+
+
+def normalize_message(text: str) -> str:
+    """Нормализация сообщения для ключа кэша: регистр, ё→е, пробелы"""
+    text = (text or "").lower().replace("ё", "е")
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" .,!?;:")
+
+
+class VerdictCache:
+    """
+    LRU-кэш вердиктов модерации с TTL.
+    Ключ — sha1 нормализованного сообщения, значение — результат check().
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(text: str) -> str:
+        return hashlib.sha1(normalize_message(text).encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[Dict]:
+        key = self.make_key(text)
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and now - item[0] <= self.ttl:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, text: str, verdict: Dict) -> None:
+        key = self.make_key(text)
+        with self._lock:
+            self._data[key] = (time.monotonic(), verdict)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
 
 
 class RussianSwearDetector:
-    def __init__(self, model_name: str = "qwen2.5:7b"):
+    def __init__(self, model_name: Optional[str] = None,
+                 cache: Optional[VerdictCache] = None,
+                 lexicon: Optional[ObsceneLexicon] = None):
         # Базовый список матерных корней (упрощённо)
         self.swear_patterns = [
             r'\b[хx][уy][йеёяю]\w*\b',
@@ -19,7 +92,16 @@ class RussianSwearDetector:
                          for p in self.swear_patterns]
 
         # Инициализация модели Ollama через LangChain
-        self.llm = OllamaLLM(model=model_name)
+        self.llm = get_llm("moderation", model_name)
+
+        # Кэш вердиктов (None — без кэша)
+        self.cache = cache
+
+        # Локальный словарный уровень (None — сразу regex → LLM)
+        self.lexicon = lexicon
+
+        # Сколько решений принял каждый уровень (regex / lexicon / ai)
+        self.tier_counts: Counter = Counter()
 
     def regex_check(self, text: str) -> Tuple[bool, List[str]]:
         """Быстрая проверка по regex"""
@@ -30,31 +112,130 @@ class RussianSwearDetector:
                 found_words.extend(matches)
         return len(found_words) > 0, found_words
 
-    def ai_check(self, text: str) -> bool:
-        """Проверка контекста через модель Ollama"""
-        prompt = f"""Текст содержит мат или оскорбления? Ответь одним словом: ДА или НЕТ.
-        Текст: {text}"""
+    def _ai_verdict(self, text: str) -> Optional[bool]:
+        """Ответ модели: True/False, None — если модель недоступна"""
+        try:
+            response = self.llm.invoke(AI_CHECK_PROMPT.format(text=text))
+            answer = response.strip().upper()
+            return "ДА" in answer
+        except Exception as e:
+            print(f"Ошибка при обращении к модели: {e}")
+            return None
 
+    async def _ai_verdict_async(self, text: str) -> Optional[bool]:
         try:
-            response = self.llm.invoke(prompt)
+            async with stage_limit("moderation"):
+                response = await self.llm.ainvoke(AI_CHECK_PROMPT.format(text=text))
             answer = response.strip().upper()
             return "ДА" in answer
         except Exception as e:
             print(f"Ошибка при обращении к модели: {e}")
-            return False
+            return None
 
-    def check(self, text: str) -> Dict:
+    def ai_check(self, text: str) -> bool:
+        """Проверка контекста через модель Ollama"""
+        return bool(self._ai_verdict(text))
+
+    async def ai_check_async(self, text: str) -> bool:
+        """Асинхронная проверка контекста через модель Ollama"""
+        return bool(await self._ai_verdict_async(text))
+
+    def _remember(self, text: str, result: Dict, cacheable: bool = True) -> Dict:
+        # Ошибки модели не кэшируем, чтобы не закрепить ложный вердикт
+        self.tier_counts[result["method"]] += 1
+        if self.cache is not None and cacheable:
+            self.cache.put(text, result)
+        return {**result, "cached": False}
+
+    def _cached(self, text: str) -> Optional[Dict]:
+        if self.cache is None:
+            return None
+        result = self.cache.get(text)
+        return {**result, "cached": True} if result is not None else None
+
+    def local_check(self, text: str) -> Tuple[Optional[Dict], List[str]]:
+        """
+        Локальные уровни без LLM: regex, затем словарь.
+        Возвращает (результат, найденные слова); результат None —
+        сообщение неоднозначное и требует проверки моделью.
+        """
         # 1. Быстрая проверка по regex
         swear_found, words = self.regex_check(text)
+        if swear_found:
+            return {"has_swear": True, "found_words": words, "method": "regex"}, words
+
+        # 2. Словарь корней с нормализацией гомоглифов (< 1 мс)
+        if self.lexicon is not None:
+            lex = self.lexicon.classify(text)
+            if lex["verdict"] != "ambiguous":
+                return {
+                    "has_swear": lex["verdict"] == "swear",
+                    "found_words": lex["found_words"],
+                    "method": "lexicon",
+                    "score": lex["score"]
+                }, lex["found_words"]
+            words = lex["found_words"]
 
-        # 2. Если не нашли явного мата, проверяем контекст через AI
-        method = "regex"
-        if not swear_found:
-            swear_found = self.ai_check(text)
-            method = "ai" if swear_found else "regex"
+        return None, words
 
-        return {
-            "has_swear": swear_found,
+    def check(self, text: str) -> Dict:
+        cached = self._cached(text)
+        if cached is not None:
+            return cached
+
+        result, words = self.local_check(text)
+        if result is not None:
+            return self._remember(text, result)
+
+        # 3. Неоднозначные сообщения проверяем контекстно через AI
+        verdict = self._ai_verdict(text)
+        return self._remember(text, {
+            "has_swear": bool(verdict),
+            "found_words": words,
+            "method": "ai"
+        }, cacheable=verdict is not None)
+
+    async def check_async(self, text: str) -> Dict:
+        """Асинхронный вариант check"""
+        cached = self._cached(text)
+        if cached is not None:
+            return cached
+
+        result, words = self.local_check(text)
+        if result is not None:
+            return self._remember(text, result)
+
+        verdict = await self._ai_verdict_async(text)
+        return self._remember(text, {
+            "has_swear": bool(verdict),
             "found_words": words,
-            "method": method
-        }
+            "method": "ai"
+        }, cacheable=verdict is not None)
+
+    def stats(self) -> Dict:
+        """Счётчики кэша вердиктов и решений по уровням"""
+        stats = self.cache.stats() if self.cache is not None else {}
+        return {**stats, "tiers": dict(self.tier_counts)}
+
+
+@lru_cache(maxsize=1)
+def get_detector() -> RussianSwearDetector:
+    """
+    Общий на процесс детектор: регулярки компилируются и клиент Ollama
+    создаётся один раз, вердикты кэшируются между запросами.
+    """
+    cache = VerdictCache(
+        maxsize=int(os.getenv("MODERATION_CACHE_SIZE", "10000")),
+        ttl=float(os.getenv("MODERATION_CACHE_TTL", "3600")),
+    )
+    lexicon = None
+    if os.getenv("MODERATION_LEXICON", "1") != "0":
+        lexicon = ObsceneLexicon(
+            use_ngrams=os.getenv("MODERATION_NGRAMS", "1") != "0",
+            ngram_threshold=float(os.getenv("MODERATION_NGRAM_THRESHOLD", "0.75")),
+        )
+    return RussianSwearDetector(
+        model_name=os.getenv("MODERATION_MODEL"),
+        cache=cache,
+        lexicon=lexicon
+    )
@@ -0,0 +1,83 @@
+# rest-api\src\lib\topic_scope.py
+import os
+import json
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+
+MANIFEST_NAME = 'build_index.manifest.json'
+
+# Ниже этого сходства лучшего чанка темы поиск расширяется на весь корпус.
+# Эмбеддинги чанков (build_index.py) и запросов (rag.py) нормируются явно,
+# поэтому для l2-расстояния Chroma (квадрат евклидова) сходство = 1 - distance / 2.
+TOPIC_SCOPE = os.getenv("TOPIC_SCOPE", "1") != "0"
+TOPIC_SCOPE_MIN_SIMILARITY = float(os.getenv("TOPIC_SCOPE_MIN_SIMILARITY", "0.8"))
+
+
+def similarity(distance: Optional[float]) -> Optional[float]:
+    return None if distance is None else 1.0 - distance / 2.0
+
+
+@lru_cache(maxsize=4)
+def _load_manifest(path: str, mtime: float) -> Dict[str, List[str]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return {key: entry.get('chunk_ids', []) for key, entry in manifest.items()}
+
+
+def chunk_manifest() -> Dict[str, List[str]]:
+    """url документа -> id его чанков (манифест build_index.py), перечитывается при изменении"""
+    path = os.path.join(os.environ.get('CHROMA_DIR', './db'), MANIFEST_NAME)
+    try:
+        return _load_manifest(path, os.path.getmtime(path))
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def topic_urls(topic_json: Optional[str]) -> List[str]:
+    """url исходных документов темы из колонки json"""
+    if not topic_json:
+        return []
+    try:
+        data = json.loads(topic_json)
+    except json.JSONDecodeError:
+        return []
+    urls = data.get('urls') or [data.get('url')]
+    return [url for url in urls if url]
+
+
+_topic_urls_cache: Dict = {}
+
+
+def topic_scope(topic) -> Optional[Dict]:
+    """
+    Область поиска для темы: {"topic_id", "urls", "chunk_ids"} или None,
+    если тема не привязана к документам корпуса.
+    url кэшируются по (id, content_hash), id чанков берутся из актуального манифеста.
+    """
+    if topic is None or not TOPIC_SCOPE:
+        return None
+    key = (topic.id, topic.content_hash)
+    urls = _topic_urls_cache.get(key) if topic.content_hash else None
+    if urls is None:
+        urls = topic_urls(topic.json)
+        if topic.content_hash:
+            if len(_topic_urls_cache) > 4096:
+                _topic_urls_cache.clear()
+            _topic_urls_cache[key] = urls
+    if not urls:
+        return None
+    manifest = chunk_manifest()
+    chunk_ids = [cid for url in urls for cid in manifest.get(url, [])]
+    return {
+        "topic_id": topic.id,
+        "urls": urls,
+        # Без манифеста BM25 ищет по всему корпусу, а Chroma — по фильтру url
+        "chunk_ids": chunk_ids or None,
+    }
+
+
+def where_filter(scope: Dict) -> Dict:
+    """Фильтр метаданных Chroma по url документов темы"""
+    urls = scope["urls"]
+    return {"url": urls[0]} if len(urls) == 1 else {"url": {"$in": urls}}
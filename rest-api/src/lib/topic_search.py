@@ -0,0 +1,169 @@
+# rest-api\src\lib\topic_search.py
+import os
+import re
+import json
+import html
+from typing import Dict, Iterable, List
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+# Лёгкий стемминг запроса: окончание отрезается, слово ищется как префикс
+SEARCH_STEMMING = os.getenv("TOPIC_SEARCH_STEMMING", "1") != "0"
+
+RUSSIAN_ENDINGS = sorted([
+    "иями", "ями", "ами", "ией", "ого", "его", "ему", "ому", "ыми", "ими",
+    "ться", "ется", "ать", "ять", "ить", "еть",
+    "ых", "их", "ая", "яя", "ое", "ее", "ые", "ие", "ой", "ей", "ий", "ый",
+    "ом", "ем", "ам", "ям", "ах", "ях", "ию", "ью", "ия", "ья", "ов", "ев",
+    "ы", "и", "а", "я", "о", "е", "у", "ю", "ь", "й",
+], key=len, reverse=True)
+MIN_STEM = 4
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+CYRILLIC_RE = re.compile(r"[а-я]")
+
+
+def normalize_text(value: str, lower: bool = True) -> str:
+    """Общая нормализация для индекса и запроса: ё→е (и нижний регистр)"""
+    if not value:
+        return ""
+    value = value.replace("ё", "е").replace("Ё", "Е")
+    return value.lower() if lower else value
+
+
+def stem(word: str) -> str:
+    """Отрезает типичное русское окончание, оставляя основу не короче MIN_STEM"""
+    if not CYRILLIC_RE.search(word):
+        return word
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def query_terms(query: str) -> List[str]:
+    """Слова запроса в синтаксисе FTS5: каждое — префиксный запрос по основе"""
+    terms = []
+    for word in WORD_RE.findall(normalize_text(query)):
+        if SEARCH_STEMMING:
+            word = stem(word)
+        terms.append(f'"{word}"*')
+    return terms
+
+
+# =========================
+# index
+# =========================
+
+def ensure_topic_index(db: Session) -> None:
+    """Создаёт FTS5-индекс тем и заполняет его, если он пуст"""
+    db.execute(text("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS topics_fts USING fts5(
+            title, description, content,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """))
+    indexed = db.execute(text("SELECT count(*) FROM topics_fts")).scalar()
+    if not indexed:
+        rebuild_topic_index(db)
+    db.commit()
+
+
+def rebuild_topic_index(db: Session, batch_size: int = 500) -> None:
+    db.execute(text("DELETE FROM topics_fts"))
+    last_id = 0
+    while True:
+        rows = db.execute(
+            text("SELECT id, title, description, json FROM topics "
+                 "WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": batch_size}
+        ).all()
+        if not rows:
+            break
+        index_topics(db, [
+            {"id": r.id, "title": r.title, "description": r.description,
+             "content": topic_content(r.json)}
+            for r in rows
+        ])
+        last_id = rows[-1].id
+    print(f"🔎 Topic search index rebuilt up to id {last_id}")
+
+
+def topic_content(topic_json: str) -> str:
+    """clean_content из колонки json темы"""
+    if not topic_json:
+        return ""
+    try:
+        data = json.loads(topic_json)
+    except json.JSONDecodeError:
+        return ""
+    return data.get("clean_content") or data.get("content") or ""
+
+
+def index_topics(db: Session, topics: Iterable[Dict]) -> None:
+    """
+    Добавляет/обновляет темы в индексе (без commit).
+    topics: словари с ключами id, title, description, content.
+    """
+    rows = [
+        {
+            "id": t["id"],
+            "title": normalize_text(t.get("title"), lower=False),
+            "description": normalize_text(t.get("description"), lower=False),
+            "content": normalize_text(t.get("content"), lower=False),
+        }
+        for t in topics
+    ]
+    if not rows:
+        return
+    db.execute(text("DELETE FROM topics_fts WHERE rowid = :id"), [{"id": r["id"]} for r in rows])
+    db.execute(
+        text("INSERT INTO topics_fts (rowid, title, description, content) "
+             "VALUES (:id, :title, :description, :content)"),
+        rows
+    )
+
+
+# =========================
+# search
+# =========================
+
+# Маркеры подсветки из символов частной зоны Unicode: в тексте тем их нет,
+# поэтому после экранирования HTML их можно заменить на теги
+MARK_OPEN = "\ue000"
+MARK_CLOSE = "\ue001"
+
+
+def highlight_snippet(snippet: str) -> str:
+    """Сниппет как безопасный HTML: текст темы экранирован, совпадения в <b>"""
+    escaped = html.escape(snippet or "")
+    return escaped.replace(MARK_OPEN, "<b>").replace(MARK_CLOSE, "</b>")
+
+
+def search_topics(db: Session, query: str, limit: int = 20) -> List[Dict]:
+    """
+    Поиск тем: bm25 с приоритетом заголовка, сниппет по лучшему совпадению.
+    Если все слова вместе не нашлись — ищем любое из них.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+
+    results = []
+    for operator in ("AND", "OR") if len(terms) > 1 else ("AND",):
+        match = f" {operator} ".join(terms)
+        results = db.execute(text("""
+            SELECT t.id, t.title, t.description, t.image,
+                   snippet(topics_fts, -1, :mark_open, :mark_close, '…', 16) AS snippet,
+                   bm25(topics_fts, 10.0, 4.0, 1.0) AS rank
+            FROM topics_fts
+            JOIN topics t ON t.id = topics_fts.rowid
+            WHERE topics_fts MATCH :match AND t.is_available = 1
+            ORDER BY rank
+            LIMIT :limit
+        """), {"match": match, "limit": limit,
+               "mark_open": MARK_OPEN, "mark_close": MARK_CLOSE}).mappings().all()
+        if results:
+            break
+    return [{**r, "snippet": highlight_snippet(r["snippet"])} for r in results]
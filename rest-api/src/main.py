@@ -1,17 +1,24 @@
+from dotenv import load_dotenv
+
+# Настройки модулей lib читаются из окружения при импорте — .env загружается до них
+load_dotenv()
+
 from database import SessionLocal
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from typing import List
 import crud
 import lib.schemas as schemas
 from lib.install import InstallSystem
-from lib.swear_detector import RussianSwearDetector
+from lib.swear_detector import get_detector
 from lib.seed_topics import seed_topics_from_jsonl
+from lib.topic_search import ensure_topic_index, index_topics, search_topics, topic_content
 import auth
 import models
-from database import engine, get_db, create_db_and_tables
+from database import engine, get_db, get_async_db, AsyncSessionLocal, create_db_and_tables, ensure_columns
 from auth import authenticate_user, create_access_token, get_current_active_user
 from fastapi.responses import StreamingResponse, JSONResponse
 from sse_starlette.sse import EventSourceResponse
@@ -19,20 +26,31 @@ import json
 from typing import Dict, Any, AsyncGenerator
 from pydantic import BaseModel
 import asyncio
+import hashlib
 from datetime import datetime
 import os
 
-from fastapi import BackgroundTasks
 import os
-from dotenv import load_dotenv
-from lib.rag import get_rag_answer, load_and_clean_documents
+from lib.rag import stream_rag_answer_async, load_and_clean_documents, embedding_batcher, ensure_lexical_index
+from lib.chat_pipeline import moderate_and_answer, moderate_and_retrieve
+from lib.topic_scope import topic_scope
+from lib.semantic_cache import get_semantic_cache
+from lib.reranker import get_reranker
+from lib.context_builder import context_stats
+from lib.structured_output import structured_stats
+from lib.llm_client import warm_up
+from lib.question_pool import enqueue_top_up, has_active_job
 
 # Create database tables
 models.Base.metadata.create_all(bind=engine)
+ensure_columns()
 
 app = FastAPI(title="AI Tutor API", version="1.0.0")
 
-load_dotenv()
+# Вопросов в одном тесте
+TEST_QUESTIONS = 4
+# Через сколько секунд повторить start-test, пока воркер готовит вопросы
+TEST_RETRY_AFTER = 15
 
 # CORS middleware
 app.add_middleware(
@@ -48,7 +66,8 @@ app.add_middleware(
 def startup_event():
     db = SessionLocal()
     try:
-        # seed topics
+        # seed topics (индекс поиска создаётся заранее — сид его дополняет)
+        ensure_topic_index(db)
         seed_topics_from_jsonl(
             db,
             os.getenv("DATA_PATH") or "/app/Notebooks/cloud_ru_docs.jsonl",
@@ -73,6 +92,36 @@ def startup_event():
 
     app.state.documents, app.state.chroma_client = load_and_clean_documents(
         limit=20)
+    ensure_lexical_index(app.state.chroma_client)
+
+
+@app.on_event("startup")
+async def warm_up_llm():
+    # Модель чата загружается с keep_alive, статический префикс промпта
+    # префиллится заранее; запуск в фоне, чтобы не задерживать старт API.
+    # Ссылка на задачу хранится в app.state, иначе её может собрать GC
+    app.state.warm_up_task = None
+    if os.getenv("LLM_WARM_UP", "1") != "0":
+        app.state.warm_up_task = asyncio.create_task(warm_up("chat"))
+
+
+@app.on_event("startup")
+async def warm_up_reranker():
+    # Кросс-энкодер скачивается и загружается в фоне; пока он не готов,
+    # чат отвечает без переранжирования, а не ждёт загрузку в запросе
+    reranker = get_reranker()
+    app.state.rerank_warm_up_task = None
+    if reranker is not None:
+        app.state.rerank_warm_up_task = asyncio.create_task(asyncio.to_thread(reranker.warm_up))
+
+
+@app.on_event("shutdown")
+async def stop_warm_up():
+    for name in ("warm_up_task", "rerank_warm_up_task"):
+        task = getattr(app.state, name, None)
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
 
 
 @app.post("/register", response_model=schemas.UserResponse)
@@ -123,6 +172,43 @@ def get_topics(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     return topics
 
 
+# Объявлены до /topics/{topic_id}, иначе "summary" разбирается как topic_id
+@app.get("/topics/summary", response_model=schemas.TopicSummaryPage)
+def get_topic_summaries(
+    request: Request,
+    after_id: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """Лёгкий список тем (без json) с keyset-пагинацией и ETag"""
+    limit = max(1, min(limit, 500))
+    topics = crud.get_topic_summaries(db, after_id=after_id, limit=limit)
+    page = schemas.TopicSummaryPage(
+        items=[schemas.TopicSummary.model_validate(t) for t in topics],
+        next_after_id=topics[-1].id if len(topics) == limit else None
+    )
+    body = page.model_dump_json()
+    etag = f'W/"{hashlib.sha1(body.encode("utf-8")).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/topics/search", response_model=List[schemas.TopicSearchResult])
+def search_topics_endpoint(q: str, limit: int = 20, db: Session = Depends(get_db)):
+    """Полнотекстовый поиск по заголовку, описанию и содержимому тем"""
+    return search_topics(db, q, limit=max(1, min(limit, 100)))
+
+
+@app.get("/topics/{topic_id}/content", response_model=schemas.TopicContent)
+def get_topic_content(topic_id: int, db: Session = Depends(get_db)):
+    topic = crud.get_topic_content(db, topic_id=topic_id)
+    if topic is None:
+        raise HTTPException(status_code=404, detail="Topic not found")
+    return topic
+
+
 @app.get("/topics/{topic_id}", response_model=schemas.TopicResponse)
 def get_topic(topic_id: int, db: Session = Depends(get_db)):
     topic = crud.get_topic(db, topic_id=topic_id)
@@ -143,29 +229,37 @@ def get_progress(
 
 
 @app.post("/topics/{topic_id}/progress", response_model=List[schemas.UserProgressResponse])
-def add_progress_message(
+async def add_progress_message(
     topic_id: int,
     progress: schemas.UserProgressCreate,
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Verify topic exists
-    topic = crud.get_topic(db, topic_id=topic_id)
+    topic = await crud.aget_topic(db, topic_id=topic_id)
     if not topic:
         raise HTTPException(status_code=404, detail="Topic not found")
 
-    detector = RussianSwearDetector(model_name='mistral')
+    collection = app.state.chroma_client.get_collection('cloud_docs')
 
-    result = detector.check(progress.message)
+    # Модерация, поиск и (опционально) генерация идут параллельно
+    outcome = await moderate_and_answer(
+        question=progress.message,
+        collection=collection,
+        detector=get_detector(),
+        topic_id=topic_id,
+        scope=topic_scope(topic)
+    )
+    result = outcome['moderation']
 
     if result['has_swear'] == True:
         progress.message = '************'
-        crud.create_user_progress(
+        await crud.acreate_user_progress(
             db=db,
             progress=progress,
             user_id=current_user.id
         )
-        crud.create_user_progress(
+        await crud.acreate_user_progress(
             db=db,
             progress=schemas.UserProgressCreate(
                 topic_id=topic_id,
@@ -175,20 +269,14 @@ def add_progress_message(
             user_id=current_user.id
         )
     else:
-        crud.create_user_progress(
+        await crud.acreate_user_progress(
             db=db,
             progress=progress,
             user_id=current_user.id
         )
-        collection = app.state.chroma_client.get_collection('cloud_docs')
-
-        rag_question = get_rag_answer(
-            question=progress.message,
-            collection=collection,
+        rag_question = outcome['rag']
 
-        )
-
-        crud.create_user_progress(
+        await crud.acreate_user_progress(
             db=db,
             progress=schemas.UserProgressCreate(
                 topic_id=topic_id,
@@ -198,53 +286,143 @@ def add_progress_message(
             user_id=current_user.id
         )
 
-    progress_list = crud.get_user_progress(
+    progress_list = await crud.aget_user_progress(
         db, user_id=current_user.id, topic_id=topic_id)
     return progress_list
 
 
+@app.post("/topics/{topic_id}/progress/stream")
+async def add_progress_message_stream(
+    topic_id: int,
+    progress: schemas.UserProgressCreate,
+    current_user: models.User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Потоковый вариант POST /topics/{topic_id}/progress (Server-Sent Events).
+
+    События: "status" — стадия обработки (первым, до модерации и поиска),
+    "sources" — найденные фрагменты, "token" — части ответа,
+    "error" — сбой генерации, "done" — итоговый ответ, сохранённый в user_progress
+    (при обрыве соединения сохраняется уже сгенерированная часть).
+    """
+    topic = await crud.aget_topic(db, topic_id=topic_id)
+    if not topic:
+        raise HTTPException(status_code=404, detail="Topic not found")
+
+    user_id = current_user.id
+    collection = app.state.chroma_client.get_collection('cloud_docs')
+    scope = topic_scope(topic)
+
+    async def save_message(is_user: bool, message: str) -> models.UserProgress:
+        # Сессия запроса к этому моменту уже закрыта — открываем свою
+        async with AsyncSessionLocal() as stream_db:
+            return await crud.acreate_user_progress(
+                db=stream_db,
+                progress=schemas.UserProgressCreate(
+                    topic_id=topic_id,
+                    is_user=is_user,
+                    message=message
+                ),
+                user_id=user_id
+            )
+
+    async def rag_events():
+        # Ответ уходит клиенту сразу: модерация и поиск идут уже внутри потока
+        yield {"event": "status", "data": json.dumps({"stage": "moderation"})}
+
+        # Поиск контекста стартует одновременно с модерацией
+        try:
+            staged = await moderate_and_retrieve(
+                question=progress.message,
+                collection=collection,
+                detector=get_detector(),
+                scope=scope
+            )
+        except Exception as e:
+            yield {"event": "error", "data": json.dumps(
+                {"message": f"Ошибка поиска: {str(e)[:100]}"}, ensure_ascii=False)}
+            return
+
+        if staged['moderation']['has_swear'] == True:
+            await save_message(True, '************')
+            answer = await save_message(False, 'Недопустимо использования ненормативной лексики')
+            yield {"event": "token", "data": answer.message}
+            yield {
+                "event": "done",
+                "data": json.dumps({"id": answer.id, "answer": answer.message,
+                                    "success": False}, ensure_ascii=False)
+            }
+            return
+
+        await save_message(True, progress.message)
+        yield {"event": "status", "data": json.dumps({"stage": "generation"})}
+
+        parts = []
+        saved = False
+        try:
+            async for item in stream_rag_answer_async(question=progress.message,
+                                                      collection=collection,
+                                                      retrieved=staged['retrieved'],
+                                                      topic_id=topic_id):
+                if item["event"] == "sources":
+                    yield {"event": "sources",
+                           "data": json.dumps(item["data"], ensure_ascii=False)}
+                elif item["event"] == "token":
+                    parts.append(item["data"])
+                    yield {"event": "token", "data": item["data"]}
+                elif item["event"] == "error":
+                    yield {"event": "error",
+                           "data": json.dumps(item["data"], ensure_ascii=False)}
+                elif item["event"] == "done":
+                    answer_id = None
+                    if item["data"]["answer"]:
+                        answer_id = (await save_message(False, item["data"]["answer"])).id
+                    saved = True
+                    yield {
+                        "event": "done",
+                        "data": json.dumps({"id": answer_id, **item["data"]},
+                                           ensure_ascii=False)
+                    }
+        finally:
+            # Клиент отключился посреди ответа: сохраняем то, что успели сгенерировать.
+            # shield — чтобы запись не оборвала повторная отмена задачи
+            partial = "".join(parts).strip()
+            if not saved and partial:
+                try:
+                    await asyncio.shield(save_message(False, partial))
+                except Exception as e:
+                    print(f"⚠️ Partial answer not saved: {str(e)[:100]}")
+
+    return EventSourceResponse(rag_events())
+
+
 @app.post("/topics/{topic_id}/start-test", response_model=schemas.TestSessionResponse)
 def start_test(
     topic_id: int,
-    background_tasks: BackgroundTasks,
     current_user: models.User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    from lib.creater_question import generate_questions_from_book
-
     topic = crud.get_topic(db, topic_id=topic_id)
     if not topic:
         raise HTTPException(status_code=404, detail="Topic not found")
 
-    questions = crud.get_questions_by_topic(db, topic_id=topic_id)
-    missing = 4 - len(questions)
-
-    def generate_missing_questions(topic_json, topic_id, missing):
-        try:
-            generated = generate_questions_from_book(
-                missing, json.loads(topic_json))
-            for q in generated:
-                crud.create_question(db, schemas.QuestionCreate(
-                    topic_id=topic_id,
-                    question_text=q["question_text"],
-                    option_a=q["option_a"],
-                    option_b=q["option_b"],
-                    option_c=q["option_c"],
-                    option_d=q["option_d"],
-                    correct_answer=q["correct_answer"]
-                ))
-            print(f"✅ Сгенерированы {missing} вопросов для топика {topic_id}")
-        except Exception as e:
-            print(f"⚠️ Ошибка генерации вопросов для топика {topic_id}: {e}")
+    # Пул вопросов пополняют воркеры (question_worker.py); задача ставится,
+    # только если в теме меньше QUESTION_POOL_MIN вопросов и её ещё нет в очереди
+    enqueue_top_up(db, topic_id)
 
-    if missing > 0:
-        # Генерация в фоне
-        background_tasks.add_task(
-            generate_missing_questions, topic.json, topic.id, missing
-        )
+    # Вопросы генерирует только воркер: пока он заполняет тему, тест не начинается
+    count = crud.count_questions(db, topic_id)
+    if count == 0 or (count < TEST_QUESTIONS and has_active_job(db, topic_id)):
+        raise HTTPException(
+            status_code=409, detail="Вопросы по теме ещё готовятся, попробуйте позже",
+            headers={"Retry-After": str(TEST_RETRY_AFTER)})
 
+    # Набор вопросов выбирается один раз при старте сессии
     test_session = crud.create_test_session(
         db, topic_id=topic_id, user_id=current_user.id)
+    crud.assign_session_questions(db, test_session, limit=TEST_QUESTIONS)
+
     print("START_TEST: created session", test_session.id, "user_id=",
           test_session.user_id, "topic_id=", test_session.topic_id)
     return test_session
@@ -265,9 +443,8 @@ def get_test_questions(
     if test_session.completed_at:
         raise HTTPException(status_code=400, detail="Test already completed")
 
-    # Get 4 random questions for the topic
-    questions = crud.get_questions_by_topic(
-        db, topic_id=test_session.topic_id, limit=4)
+    # Вопросы, закреплённые за сессией (недостающие добираются, если их догенерировали)
+    questions = crud.assign_session_questions(db, test_session, limit=TEST_QUESTIONS)
     print("GET_QUESTIONS:", "session_id=", session_id,
           "current_user.id=", current_user.id)
     return questions
@@ -289,9 +466,8 @@ def submit_test(
     if test_session.completed_at:
         raise HTTPException(status_code=400, detail="Test already completed")
 
-    # Get questions for this topic
-    questions = crud.get_questions_by_topic(
-        db, topic_id=test_session.topic_id, limit=4)
+    # Проверяем по тем же вопросам, что были показаны
+    questions = crud.get_session_questions(db, session_id=session_id)
     question_dict = {q.id: q for q in questions}
 
     # Check answers and calculate score
@@ -332,12 +508,13 @@ def submit_test(
     db.commit()
 
     # Prepare response
-    percentage = (correct_count / 4) * 100 if questions else 0
+    total_questions = len(questions)
+    percentage = (correct_count / total_questions) * 100 if total_questions else 0
 
     return schemas.TestResultResponse(
         session=test_session,
         correct_answers=correct_count,
-        total_questions=4,
+        total_questions=total_questions,
         percentage=percentage
     )
 
@@ -356,24 +533,25 @@ def get_test_history(
 
 
 @app.get("/admin/generated/questions", response_model=str)
-def get_generated_questions(
+async def get_generated_questions(
     topic_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    topic = crud.get_topic(db, topic_id=topic_id)
+    topic = await crud.aget_topic(db, topic_id=topic_id)
     if topic is None:
         raise HTTPException(status_code=404, detail="Topic not found")
 
     # Пытаемся импортировать генератор только когда реально нужен
     try:
-        from lib.creater_question import generate_questions_from_book
+        from lib.creater_question import generate_questions_from_book_async
     except ImportError as e:
         raise HTTPException(
             status_code=500,
             detail=f"Генерация вопросов сейчас недоступна: {e}"
         )
 
-    generated_data = generate_questions_from_book(4, json.loads(topic.json))
+    generated_data = await generate_questions_from_book_async(
+        TEST_QUESTIONS, json.loads(topic.json))
 
     for question_item in generated_data:
         question_create = schemas.QuestionCreate(
@@ -385,7 +563,7 @@ def get_generated_questions(
             correct_answer=question_item["correct_answer"],
             topic_id=topic_id
         )
-        crud.create_question(db=db, question=question_create)
+        await crud.acreate_question(db=db, question=question_create)
 
     return "success"
 
@@ -397,7 +575,15 @@ def create_topic_admin(
     db: Session = Depends(get_db)
 ):
     # In production, add admin check here
-    return crud.create_topic(db=db, topic=topic)
+    db_topic = crud.create_topic(db=db, topic=topic)
+    index_topics(db, [{
+        "id": db_topic.id,
+        "title": db_topic.title,
+        "description": db_topic.description,
+        "content": topic_content(db_topic.json)
+    }])
+    db.commit()
+    return db_topic
 
 
 @app.post("/admin/questions", response_model=schemas.QuestionResponse)
@@ -424,6 +610,20 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+def get_metrics():
+    semantic_cache = get_semantic_cache()
+    reranker = get_reranker()
+    return {
+        "moderation": get_detector().stats(),
+        "semantic_cache": semantic_cache.stats() if semantic_cache else None,
+        "query_embeddings": embedding_batcher.stats(),
+        "rerank": reranker.stats() if reranker else None,
+        "context": context_stats.stats(),
+        "structured_output": structured_stats.stats()
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8030)
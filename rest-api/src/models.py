@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, Integer, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import String, Integer, Boolean, DateTime, Text, ForeignKey, Index, text
 from datetime import datetime
+import random
 from database import Base
 
 
@@ -34,6 +35,8 @@ class Topic(Base):
     description: Mapped[str] = mapped_column(Text, nullable=True)  #  добавили
     image: Mapped[str] = mapped_column(String(200), nullable=True) #  сделали nullable
     json: Mapped[str] = mapped_column(Text, nullable=True)
+    # sha256 полей темы при сиде — обновляем только изменившиеся темы
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=True)
 
     is_available: Mapped[bool] = mapped_column(Boolean, default=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -47,9 +50,15 @@ class Topic(Base):
         "TestSession", back_populates="topic", cascade="all, delete-orphan")
 
 
+def new_random_key() -> int:
+    return random.getrandbits(31)
+
+
 class Question(Base):
     """Таблица вопросов для тестов"""
     __tablename__ = "questions"
+    # Случайная выборка вопросов темы — поиск по индексу от случайной точки
+    __table_args__ = (Index("ix_questions_topic_random_key", "topic_id", "random_key"),)
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     topic_id: Mapped[int] = mapped_column(
@@ -60,11 +69,14 @@ class Question(Base):
     option_c: Mapped[str] = mapped_column(String(255))
     option_d: Mapped[str] = mapped_column(String(255))
     correct_answer: Mapped[str] = mapped_column(String(1), nullable=False)
+    random_key: Mapped[int] = mapped_column(Integer, default=new_random_key, nullable=True)
 
     # Relationships
     topic = relationship("Topic", back_populates="questions")
     test_answers = relationship(
         "TestAnswer", back_populates="question", cascade="all, delete-orphan")
+    session_links = relationship(
+        "TestSessionQuestion", back_populates="question", cascade="all, delete-orphan")
 
 
 class UserProgress(Base):
@@ -105,6 +117,24 @@ class TestSession(Base):
     topic = relationship("Topic", back_populates="test_sessions")
     answers = relationship(
         "TestAnswer", back_populates="test_session", cascade="all, delete-orphan")
+    question_links = relationship(
+        "TestSessionQuestion", back_populates="test_session", cascade="all, delete-orphan",
+        order_by="TestSessionQuestion.position")
+
+
+class TestSessionQuestion(Base):
+    """Вопросы, выбранные для сессии при старте: их показывают и по ним же проверяют"""
+    __tablename__ = "test_session_questions"
+
+    test_session_id: Mapped[int] = mapped_column(
+        ForeignKey("test_sessions.id"), primary_key=True)
+    position: Mapped[int] = mapped_column(Integer, primary_key=True)
+    question_id: Mapped[int] = mapped_column(
+        ForeignKey("questions.id"), nullable=False)
+
+    # Relationships
+    test_session = relationship("TestSession", back_populates="question_links")
+    question = relationship("Question", back_populates="session_links")
 
 
 class TestAnswer(Base):
@@ -124,3 +154,30 @@ class TestAnswer(Base):
     # Relationships
     test_session = relationship("TestSession", back_populates="answers")
     question = relationship("Question", back_populates="test_answers")
+
+
+class QuestionJob(Base):
+    """
+    Очередь догенерации вопросов темы (выполняют воркеры question_worker.py).
+    На тему — не больше одной незавершённой задачи (частичный уникальный индекс).
+    """
+    __tablename__ = "question_jobs"
+    __table_args__ = (
+        Index("ux_question_jobs_active_topic", "topic_id", unique=True,
+              sqlite_where=text("status IN ('pending', 'running')")),
+        Index("ix_question_jobs_status", "status", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    topic_id: Mapped[int] = mapped_column(
+        ForeignKey("topics.id"), nullable=False)
+    # pending -> running -> done | failed; running с истёкшей арендой снова берётся в работу
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    generated: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    locked_by: Mapped[str] = mapped_column(String(64), nullable=True)
+    locked_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow)
+    finished_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
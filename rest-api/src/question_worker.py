@@ -0,0 +1,84 @@
+import os
+import time
+import socket
+import argparse
+import multiprocessing as mp
+from dotenv import load_dotenv
+
+# Настройки модулей lib читаются при импорте — .env загружается до них
+load_dotenv()
+
+from database import SessionLocal, engine, ensure_columns
+import models
+from lib.question_pool import (QUESTION_POOL_MIN, claim_job, enqueue_low_topics,
+                               queue_stats, run_job)
+
+
+def worker_loop(index: int, min_pool: int, poll: float, scan_interval: float, once: bool):
+    """
+    Цикл воркера: берёт задачу из question_jobs и догенерирует вопросы темы.
+    Воркер 0 дополнительно раз в scan_interval ставит в очередь темы,
+    где вопросов меньше min_pool.
+    """
+    from lib.creater_question import generate_questions_from_book
+
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    db = SessionLocal()
+    last_scan = time.monotonic()  # первый проход делает основной процесс
+    try:
+        while True:
+            if index == 0 and time.monotonic() - last_scan >= scan_interval:
+                queued = enqueue_low_topics(db, min_pool=min_pool)
+                if queued:
+                    print(f"[{worker_id}] queued {queued} topics below {min_pool} questions")
+                last_scan = time.monotonic()
+
+            job = claim_job(db, worker_id)
+            if job is None:
+                if once:
+                    break
+                time.sleep(poll)
+                continue
+
+            t0 = time.perf_counter()
+            generated = run_job(db, job, generate_questions_from_book, min_pool=min_pool)
+            print(f"[{worker_id}] job {job.id} topic {job.topic_id}: "
+                  f"+{generated} questions in {time.perf_counter() - t0:.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Воркеры пула вопросов: держат в каждой теме не меньше QUESTION_POOL_MIN вопросов')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='число процессов (параллельных генераций в Ollama)')
+    parser.add_argument('--min_pool', type=int, default=QUESTION_POOL_MIN)
+    parser.add_argument('--poll', type=float, default=2.0, help='пауза при пустой очереди, с')
+    parser.add_argument('--scan_interval', type=float, default=300.0,
+                        help='как часто искать темы с недостающими вопросами, с')
+    parser.add_argument('--once', action='store_true',
+                        help='разобрать очередь и выйти')
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    ensure_columns()
+
+    db = SessionLocal()
+    print(f"Queued {enqueue_low_topics(db, min_pool=args.min_pool)} topics "
+          f"below {args.min_pool} questions; jobs: {queue_stats(db)}")
+    db.close()
+
+    processes = [
+        mp.Process(target=worker_loop,
+                   args=(i, args.min_pool, args.poll, args.scan_interval, args.once))
+        for i in range(args.workers)
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+    db = SessionLocal()
+    print(f"Question jobs: {queue_stats(db)}")
+    db.close()